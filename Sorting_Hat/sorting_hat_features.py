@@ -0,0 +1,58 @@
+"""
+Shared Sorting Hat feature engineering
+Used by train_enhanced.py and the AI server, so training and serving compute identical features
+"""
+
+import numpy as np
+
+# Trait columns in the order of the (N, 8) trait matrix
+TRAIT_COLUMNS = ['bravery_score', 'wisdom_score', 'ambition_score', 'loyalty_score',
+                 'leadership', 'impulsiveness', 'justice_oriented', 'risk_taking']
+BASIC_TRAIT_COLUMNS = ['bravery_score', 'wisdom_score', 'ambition_score', 'loyalty_score']
+
+DERIVED_COLUMNS = ['bravery_loyalty_ratio', 'wisdom_ambition_ratio', 'leadership_potential',
+                   'moral_flexibility', 'calculated_thinking', 'courage_type',
+                   'gryffindor_composite', 'hufflepuff_composite', 'ravenclaw_composite', 'slytherin_composite']
+FEATURE_COLUMNS = TRAIT_COLUMNS + DERIVED_COLUMNS
+
+# Traits a caller does not provide (e.g. only the basic 4) default to the middle of the scale
+DEFAULT_TRAIT_SCORE = 5
+
+def interaction_features(trait_matrix):
+    """Compute the (N, 18) feature matrix in FEATURE_COLUMNS order from an (N, 8) trait matrix"""
+    traits = np.atleast_2d(np.asarray(trait_matrix, dtype=np.float64))
+    bravery, wisdom, ambition, loyalty, leadership, impulsiveness, justice, risk = traits.T
+
+    moral_flexibility = 10 - justice  # Inverse of justice orientation
+    calculated_thinking = (wisdom + (10 - impulsiveness)) / 2
+
+    derived = [
+        bravery / (loyalty + 0.1),
+        wisdom / (ambition + 0.1),
+        (leadership + bravery + ambition) / 3,
+        moral_flexibility,
+        calculated_thinking,
+        bravery * risk / 10,  # Physical vs intellectual courage
+        # House-specific composites
+        bravery * 0.3 + justice * 0.25 + loyalty * 0.25 + risk * 0.2,
+        loyalty * 0.4 + justice * 0.25 + (10 - ambition) * 0.2 + (10 - impulsiveness) * 0.15,
+        wisdom * 0.35 + calculated_thinking * 0.25 + ambition * 0.2 + leadership * 0.2,
+        ambition * 0.35 + leadership * 0.25 + wisdom * 0.2 + moral_flexibility * 0.2
+    ]
+    return np.column_stack([traits] + derived)
+
+def select_features(features, feature_columns):
+    """Reorder a FEATURE_COLUMNS matrix into the column order a model was trained with"""
+    return features[:, [FEATURE_COLUMNS.index(col) for col in feature_columns]]
+
+def create_interaction_features(df):
+    """Add the derived feature columns to a DataFrame holding the trait columns"""
+    features = interaction_features(df[TRAIT_COLUMNS].to_numpy())
+    for i, name in enumerate(DERIVED_COLUMNS, start=len(TRAIT_COLUMNS)):
+        df[name] = features[:, i]
+    return df
+
+def create_interaction_features_dict(traits):
+    """Create interaction features for a single row of traits given as a dict"""
+    row = [traits.get(col, DEFAULT_TRAIT_SCORE) for col in TRAIT_COLUMNS]
+    return dict(zip(FEATURE_COLUMNS, interaction_features(row)[0].tolist()))
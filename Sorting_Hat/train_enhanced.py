@@ -6,16 +6,55 @@ Incorporates detailed house characteristics and all questions from Question_Bank
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold, ParameterGrid
 from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.pipeline import make_pipeline
+from concurrent.futures import ProcessPoolExecutor
 import joblib
 import json
-import random
+import os
+import time
+import argparse
 from sklearn.preprocessing import StandardScaler
+from sklearn.utils.class_weight import compute_class_weight
+from sorting_hat_features import FEATURE_COLUMNS, create_interaction_features
 
-def generate_enhanced_training_data(n_samples=2000):
+# Hyperparameter search space: model name -> (estimator, parameter grid, trained on scaled features)
+SEARCH_SPACE = {
+    'DecisionTree': (DecisionTreeClassifier, {
+        'max_depth': [8, 12, 15, None],
+        'min_samples_split': [10],
+        'min_samples_leaf': [1, 5, 10],
+        'class_weight': ['balanced'],
+        'random_state': [42]
+    }, False),
+    'RandomForest': (RandomForestClassifier, {
+        'n_estimators': [100, 200],
+        'max_depth': [12, None],
+        'min_samples_split': [10],
+        'min_samples_leaf': [1, 5],
+        'class_weight': ['balanced'],
+        'random_state': [42]
+    }, True),
+    'GradientBoosting': (GradientBoostingClassifier, {
+        'n_estimators': [100, 200],
+        'learning_rate': [0.05, 0.1],
+        'max_depth': [3],
+        'random_state': [42]
+    }, False)
+}
+CV_FOLDS = 5
+SEARCH_WORKERS = os.cpu_count() or 1
+
+# Chunked training over datasets larger than memory
+HOUSES = ['Gryffindor', 'Hufflepuff', 'Ravenclaw', 'Slytherin']
+CHUNK_ROWS = 100_000
+FOREST_TREES = 100  # Fixed forest size for chunked training, however many blocks the data has
+
+def generate_enhanced_training_data(n_samples=2000, seed=42):
     """Generate enhanced synthetic data based on detailed house characteristics"""
     
     # Enhanced house trait profiles based on the PDF characteristics
@@ -29,7 +68,6 @@ def generate_enhanced_training_data(n_samples=2000):
             'impulsiveness': (6, 9),       # Tend to be impulsive
             'justice_oriented': (7, 10),   # Strong sense of justice
             'risk_taking': (7, 10),        # High risk tolerance
-            'honor_focused': (7, 10),      # Value honor highly
         },
         'Hufflepuff': {
             'bravery_score': (4, 7),       # Quiet courage
@@ -40,7 +78,6 @@ def generate_enhanced_training_data(n_samples=2000):
             'impulsiveness': (2, 5),       # More thoughtful/patient
             'justice_oriented': (6, 9),    # Strong sense of fairness
             'risk_taking': (3, 6),         # More cautious
-            'honor_focused': (6, 9),       # Value integrity
         },
         'Ravenclaw': {
             'bravery_score': (3, 7),       # Intellectual courage
@@ -51,7 +88,6 @@ def generate_enhanced_training_data(n_samples=2000):
             'impulsiveness': (2, 5),       # Think before acting
             'justice_oriented': (5, 8),    # Logical approach to justice
             'risk_taking': (4, 7),         # Calculated risks
-            'honor_focused': (5, 8),       # Value truth and knowledge
         },
         'Slytherin': {
             'bravery_score': (5, 8),       # Calculated bravery
@@ -62,63 +98,29 @@ def generate_enhanced_training_data(n_samples=2000):
             'impulsiveness': (3, 6),       # More calculating
             'justice_oriented': (3, 7),    # Flexible moral code
             'risk_taking': (5, 8),         # Strategic risk-taking
-            'honor_focused': (4, 7),       # Pragmatic about honor
         }
     }
     
-    data = []
     houses = list(house_profiles.keys())
+    traits = list(house_profiles[houses[0]].keys())
+    low = np.array([[house_profiles[house][trait][0] for trait in traits] for house in houses])
+    high = np.array([[house_profiles[house][trait][1] for trait in traits] for house in houses])
     
-    # Set random seed for reproducibility
-    np.random.seed(42)
-    random.seed(42)
+    # Seeded generator, so a given seed always reproduces the same dataset
+    rng = np.random.default_rng(seed)
     
-    for _ in range(n_samples):
-        # Randomly select a house
-        house = random.choice(houses)
-        profile = house_profiles[house]
-        
-        # Generate scores based on house profile
-        sample = {'house': house}
-        
-        for trait, (min_val, max_val) in profile.items():
-            if trait == 'house':
-                continue
-            base_score = np.random.randint(min_val, max_val + 1)
-            
-            # Add some noise and cross-house variance (15% chance)
-            if random.random() < 0.15:
-                noise = random.randint(-2, 2)
-                base_score = max(1, min(10, base_score + noise))
-            
-            sample[trait] = str(base_score)
-        
-        data.append(sample)
+    # Randomly select a house per sample, then draw every trait from its profile range in one block
+    house_index = rng.integers(0, len(houses), size=n_samples)
+    scores = rng.integers(low[house_index], high[house_index] + 1)
     
-    return pd.DataFrame(data)
-
-def create_interaction_features(df):
-    """Create interaction features to capture complex relationships"""
-    
-    # Create derived features
-    df['bravery_loyalty_ratio'] = df['bravery_score'] / (df['loyalty_score'] + 0.1)
-    df['wisdom_ambition_ratio'] = df['wisdom_score'] / (df['ambition_score'] + 0.1)
-    df['leadership_potential'] = (df['leadership'] + df['bravery_score'] + df['ambition_score']) / 3
-    df['moral_flexibility'] = 10 - df['justice_oriented']  # Inverse of justice orientation
-    df['calculated_thinking'] = (df['wisdom_score'] + (10 - df['impulsiveness'])) / 2
-    df['courage_type'] = df['bravery_score'] * df['risk_taking'] / 10  # Physical vs intellectual courage
-    
-    # House-specific composite scores
-    df['gryffindor_composite'] = (df['bravery_score'] * 0.3 + df['honor_focused'] * 0.25 + 
-                                 df['justice_oriented'] * 0.25 + df['loyalty_score'] * 0.2)
-    df['hufflepuff_composite'] = (df['loyalty_score'] * 0.4 + df['justice_oriented'] * 0.25 + 
-                                 df['honor_focused'] * 0.2 + (10 - df['ambition_score']) * 0.15)
-    df['ravenclaw_composite'] = (df['wisdom_score'] * 0.35 + df['calculated_thinking'] * 0.25 + 
-                                df['ambition_score'] * 0.2 + df['leadership'] * 0.2)
-    df['slytherin_composite'] = (df['ambition_score'] * 0.35 + df['leadership'] * 0.25 + 
-                                df['wisdom_score'] * 0.2 + df['moral_flexibility'] * 0.2)
-    
-    return df
+    # Add some noise and cross-house variance (15% chance per trait)
+    noisy = rng.random(scores.shape) < 0.15
+    noise = rng.integers(-2, 3, size=scores.shape)
+    scores = np.where(noisy, np.clip(scores + noise, 1, 10), scores)
+    
+    data = pd.DataFrame(scores.astype(np.int8), columns=traits)
+    data.insert(0, 'house', pd.Categorical.from_codes(house_index, categories=houses))
+    return data
 
 def process_question_bank(df):
     """Process the question bank to create a structured format"""
@@ -154,6 +156,279 @@ def process_question_bank(df):
     
     return questions
 
+def evaluate_config(name, params, X, y):
+    """Score one model configuration with stratified k-fold CV (runs in a worker process)"""
+    estimator_class, _, scaled = SEARCH_SPACE[name]
+    estimator = estimator_class(**params)
+    if scaled:
+        estimator = make_pipeline(StandardScaler(), estimator)  # Scaler is refit inside each fold
+    
+    start_time = time.time()
+    folds = StratifiedKFold(n_splits=CV_FOLDS, shuffle=True, random_state=42)
+    scores = cross_val_score(estimator, X, y, cv=folds, scoring='accuracy')
+    return {
+        'model': name,
+        'params': json.dumps(params),
+        'cv_accuracy': scores.mean(),
+        'cv_std': scores.std(),
+        'wall_time': time.time() - start_time
+    }
+
+def search_models(X, y):
+    """Grid-search every model family in parallel and return the leaderboard, best first"""
+    configs = [(name, params) for name, (_, grid, _) in SEARCH_SPACE.items() for params in ParameterGrid(grid)]
+    print(f"Evaluating {len(configs)} configurations with {CV_FOLDS}-fold CV on {SEARCH_WORKERS} workers...")
+    
+    results = []
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+        futures = [executor.submit(evaluate_config, name, params, X, y) for name, params in configs]
+        for future in futures:
+            result = future.result()
+            print(f"  {result['model']} {result['params']}: {result['cv_accuracy']:.4f} "
+                  f"(+/- {result['cv_std']:.4f}) in {result['wall_time']:.2f}s")
+            results.append(result)
+    print(f"Search finished in {time.time() - start_time:.1f}s")
+    
+    return pd.DataFrame(results).sort_values(['cv_accuracy', 'wall_time'], ascending=[False, True]).reset_index(drop=True)
+
+def export_flat_model(model, scaler=None):
+    """Flatten a fitted DecisionTree or RandomForest and its scaler into contiguous node arrays"""
+    estimators = model.estimators_ if hasattr(model, 'estimators_') else [model]
+    trees = [estimator.tree_ for estimator in estimators]
+    roots = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+    
+    children_left, children_right = [], []
+    for tree, root in zip(trees, roots):
+        nodes = np.arange(tree.node_count) + root
+        is_leaf = tree.children_left < 0
+        # Leaves point back at themselves, so every row can take max_depth steps without branching
+        children_left.append(np.where(is_leaf, nodes, tree.children_left + root))
+        children_right.append(np.where(is_leaf, nodes, tree.children_right + root))
+    
+    feature = np.concatenate([np.maximum(tree.feature, 0) for tree in trees])
+    threshold = np.concatenate([tree.threshold for tree in trees])
+    value = np.concatenate([tree.value[:, 0, :] for tree in trees])
+    value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-12)  # Leaf class probabilities
+    
+    n_features = model.n_features_in_
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    return {
+        'scaler_mean': np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64),
+        'scaler_scale': np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64),
+        'roots': roots.astype(np.int32),
+        'children': np.stack([np.concatenate(children_left), np.concatenate(children_right)], axis=1).astype(np.int32),
+        'feature': feature.astype(np.int32),
+        'threshold': threshold.astype(np.float64),
+        'value': value.astype(np.float64),
+        'max_depth': max(tree.max_depth for tree in trees),
+        'classes': np.asarray(model.classes_).astype(str)
+    }
+
+def save_model_artifact(model_data, path):
+    """Save a joblib artifact atomically, so a server watching the directory never loads a partial file"""
+    # Written next to its destination and renamed into place; the '.tmp' suffix
+    # keeps the partial file out of the registry's '*.joblib' scan
+    tmp_path = path + '.tmp'
+    joblib.dump(model_data, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+
+def save_flat_model(flat_model, path):
+    """Write a flat model as a directory of .npy arrays, one file per array however many trees it holds"""
+    tmp_path = path + '.tmp'
+    os.makedirs(tmp_path)
+    for name, values in flat_model.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(values))
+    os.rename(tmp_path, path)
+
+def save_model_version(model_data, path):
+    """Save a registry version split so servers only share-map what they serve from"""
+    # <stem>.flat/     flat node arrays, memory-mapped by every worker through the page cache
+    # <stem>.estimator the sklearn estimator, loaded only for large batches
+    # <stem>.joblib    small index pointing at both, written last so the registry never sees a partial version
+    index = dict(model_data)
+    if model_data.get('flat_model') is not None:
+        stem = os.path.splitext(path)[0]
+        save_flat_model(model_data['flat_model'], stem + '.flat')
+        save_model_artifact(model_data['model'], stem + '.estimator')
+        index.update(model=None, flat_model=None,
+                     flat_model_dir=os.path.basename(stem + '.flat'),
+                     estimator_path=os.path.basename(stem + '.estimator'))
+    save_model_artifact(index, path)
+
+# Versioned artifacts go where the AI server's model registry looks for them
+# (its SORTING_HAT_MODEL_DIR defaults to ../Sorting_Hat/models, i.e. this directory)
+MODEL_DIR = os.getenv("SORTING_HAT_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+def publish_model(model_data, leaderboard=None):
+    """Save the model as a new version in MODEL_DIR, plus the self-contained copy older servers load"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    version_path = os.path.join(MODEL_DIR, f"sorting_hat_{time.strftime('%Y%m%d-%H%M%S')}.joblib")
+    if leaderboard is not None:
+        # Kept beside the version it chose, so every artifact can be traced back to its search
+        leaderboard_path = os.path.splitext(version_path)[0] + '.leaderboard.csv'
+        leaderboard.to_csv(leaderboard_path, index=False)
+        print(f"Leaderboard saved to '{leaderboard_path}'")
+    save_model_version(model_data, version_path)
+    save_model_artifact(model_data, 'enhanced_sorting_hat_model.joblib')
+    print(f"Enhanced model saved as '{version_path}' and 'enhanced_sorting_hat_model.joblib'")
+    return version_path
+
+def save_columnar(df, path):
+    """Write a DataFrame as a directory of typed .npy columns plus a schema.json sidecar"""
+    os.makedirs(path, exist_ok=True)
+    schema = {'rows': len(df), 'columns': []}
+    for name in df.columns:
+        column = df[name]
+        entry = {'name': name}
+        if isinstance(column.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(column):
+            # Labels are stored as small integer codes; the sidecar keeps the category names
+            column = column.astype('category')
+            entry['categories'] = column.cat.categories.astype(str).tolist()
+            values = column.cat.codes.to_numpy()
+        elif pd.api.types.is_integer_dtype(column):
+            values = pd.to_numeric(column, downcast='integer').to_numpy()
+        else:
+            values = column.to_numpy()
+        entry['dtype'] = values.dtype.str
+        np.save(os.path.join(path, f"{name}.npy"), values)
+        schema['columns'].append(entry)
+    
+    with open(os.path.join(path, 'schema.json'), 'w') as f:
+        json.dump(schema, f, indent=2)
+
+def load_columnar(path, mmap=True):
+    """Load a save_columnar directory, memory-mapping each column instead of parsing text"""
+    with open(os.path.join(path, 'schema.json')) as f:
+        schema = json.load(f)
+    
+    columns = {}
+    for entry in schema['columns']:
+        values = np.load(os.path.join(path, f"{entry['name']}.npy"), mmap_mode='r' if mmap else None)
+        if 'categories' in entry:
+            columns[entry['name']] = pd.Categorical.from_codes(values, categories=entry['categories'])
+        else:
+            columns[entry['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+def compare_load_speed(csv_path, columnar_path, repeats=5):
+    """Report how much faster the columnar copy of a dataset loads than its CSV"""
+    def timed(load):
+        best = float('inf')
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            df = load()
+            df.select_dtypes('number').to_numpy().sum()  # Touch every value, so mapped pages are read too
+            best = min(best, time.perf_counter() - start_time)
+        return best
+    
+    csv_time = timed(lambda: pd.read_csv(csv_path))
+    columnar_time = timed(lambda: load_columnar(columnar_path))
+    print(f"Load time - CSV: {csv_time * 1000:.1f}ms, columnar: {columnar_time * 1000:.1f}ms "
+          f"(speed-up {csv_time / columnar_time:.1f}x)")
+    return csv_time, columnar_time
+
+def write_training_data_chunked(path, n_samples, chunk_rows=CHUNK_ROWS, seed=42):
+    """Generate synthetic data block by block and append it to a CSV, never holding the whole set"""
+    block_seeds = np.random.SeedSequence(seed).spawn(-(-n_samples // chunk_rows))
+    for i, block_seed in enumerate(block_seeds):
+        block = generate_enhanced_training_data(min(chunk_rows, n_samples - i * chunk_rows), seed=block_seed)
+        block.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+def iter_training_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield (features, houses) blocks from a CSV, Parquet or columnar dataset, computing interaction features per block"""
+    if os.path.isdir(path):
+        data = load_columnar(path)
+        blocks = (data.iloc[start:start + chunk_rows].copy() for start in range(0, len(data), chunk_rows))
+    elif path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet training data requires pyarrow (pip install pyarrow)")
+        blocks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows))
+    else:
+        blocks = pd.read_csv(path, chunksize=chunk_rows)
+    
+    for block in blocks:
+        # Always recompute, so files written by older feature code are served the current definitions
+        block = create_interaction_features(block)
+        yield block[FEATURE_COLUMNS], block['house'].astype(str)
+
+def count_training_rows(path):
+    """Count the rows of a CSV, Parquet or columnar dataset without loading it"""
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'schema.json')) as f:
+            return json.load(f)['rows']
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f) - 1  # Minus the header
+
+def train_chunked(path, learner='forest', chunk_rows=CHUNK_ROWS, trees=FOREST_TREES):
+    """Train incrementally over a dataset read in blocks, so memory stays flat as it grows"""
+    # Hold out part of the first block for evaluation
+    X_first, y_first = next(iter_training_chunks(path, chunk_rows))
+    feature_columns = X_first.columns.tolist()
+    _, X_test, _, y_test = train_test_split(X_first, y_first, test_size=0.2, random_state=42, stratify=y_first)
+    held_out = set(X_test.index)
+    
+    def training_blocks():
+        for i, (X, y) in enumerate(iter_training_chunks(path, chunk_rows)):
+            if i == 0:
+                keep = ~X.index.isin(held_out)
+                X, y = X[keep], y[keep]
+            yield i, X[feature_columns], y
+    
+    scaler = None
+    rows = 0
+    if learner == 'forest':
+        # Warm-started forest with a fixed budget of trees spread over evenly spaced blocks: each
+        # used block grows its share, and with more blocks than trees the rest are skipped, so
+        # model size does not grow with the dataset. Trees need no scaling.
+        n_blocks = -(-count_training_rows(path) // chunk_rows)
+        block_trees = np.bincount(np.linspace(0, n_blocks, trees, endpoint=False).astype(int), minlength=n_blocks)
+        # 'balanced' would re-weight per block, so fix the weights from the first block instead
+        class_weight = dict(zip(HOUSES, compute_class_weight('balanced', classes=np.array(HOUSES), y=y_first)))
+        model = RandomForestClassifier(
+            n_estimators=0, warm_start=True, random_state=42, max_depth=12,
+            min_samples_split=10, min_samples_leaf=5, class_weight=class_weight, n_jobs=-1
+        )
+        for i, X, y in training_blocks():
+            if i >= n_blocks or block_trees[i] == 0:
+                continue
+            if y.nunique() < len(HOUSES):
+                raise ValueError(f"Block {i} does not contain every house; use larger chunks")
+            model.n_estimators += int(block_trees[i])
+            model.fit(X, y)
+            rows += len(X)
+            print(f"  Block {i}: {len(X)} rows, {model.n_estimators} trees")
+        model_type = 'RandomForest'
+    else:
+        # Linear model with partial_fit: one pass fits the scaler, a second trains on scaled blocks
+        scaler = StandardScaler()
+        for _, X, _ in training_blocks():
+            scaler.partial_fit(X)
+        model = SGDClassifier(loss='log_loss', random_state=42)
+        for i, X, y in training_blocks():
+            model.partial_fit(scaler.transform(X), y, classes=HOUSES)
+            rows += len(X)
+            print(f"  Block {i}: {len(X)} rows")
+        model_type = 'SGD'
+    
+    X_test = X_test[feature_columns]
+    accuracy = accuracy_score(y_test, model.predict(scaler.transform(X_test) if scaler else X_test))
+    print(f"Trained {model_type} on {rows} rows; held-out accuracy: {accuracy:.4f}")
+    
+    return {
+        'model': model,
+        'scaler': scaler,
+        'feature_columns': feature_columns,
+        'model_type': model_type,
+        'flat_model': export_flat_model(model) if learner == 'forest' else None
+    }
+
 def main():
     print("Starting Enhanced Sorting Hat Model Training...")
     
@@ -172,10 +447,12 @@ def main():
     
     # Save enhanced training data
     training_data.to_csv('enhanced_sorting_hat_data.csv', index=False)
-    print("Enhanced training data saved to 'enhanced_sorting_hat_data.csv'")
+    save_columnar(training_data, 'enhanced_sorting_hat_data.columnar')
+    print("Enhanced training data saved to 'enhanced_sorting_hat_data.csv' and 'enhanced_sorting_hat_data.columnar'")
+    compare_load_speed('enhanced_sorting_hat_data.csv', 'enhanced_sorting_hat_data.columnar')
     
     # Prepare features and target
-    feature_columns = [col for col in training_data.columns if col != 'house']
+    feature_columns = FEATURE_COLUMNS
     X = training_data[feature_columns]
     y = training_data['house']
     
@@ -192,63 +469,30 @@ def main():
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    # Train multiple models and compare
-    models = {
-        'DecisionTree': DecisionTreeClassifier(
-            random_state=42,
-            max_depth=15,
-            min_samples_split=10,
-            min_samples_leaf=5,
-            class_weight='balanced'
-        ),
-        'RandomForest': RandomForestClassifier(
-            n_estimators=100,
-            random_state=42,
-            max_depth=12,
-            min_samples_split=10,
-            min_samples_leaf=5,
-            class_weight='balanced'
-        )
-    }
-    
-    best_model = None
-    best_accuracy = 0
-    best_model_name = ""
+    # Search hyperparameters for every model family on the training split
+    leaderboard = search_models(X_train, y_train)
     
-    for name, model in models.items():
-        print(f"\nTraining {name}...")
-        
-        if name == 'RandomForest':
-            model.fit(X_train_scaled, y_train)
-            y_pred = model.predict(X_test_scaled)
-        else:
-            model.fit(X_train, y_train)
-            y_pred = model.predict(X_test)
-        
-        accuracy = accuracy_score(y_test, y_pred)
-        print(f"{name} Accuracy: {accuracy:.4f}")
-        
-        if accuracy > best_accuracy:
-            best_accuracy = accuracy
-            best_model = model
-            best_model_name = name
+    # Refit the best configuration on the full training split
+    best_model_name = leaderboard.loc[0, 'model']
+    estimator_class, _, best_scaled = SEARCH_SPACE[best_model_name]
+    best_model = estimator_class(**json.loads(leaderboard.loc[0, 'params']))
+    if best_scaled:
+        best_model.fit(X_train_scaled, y_train)
+        best_accuracy = accuracy_score(y_test, best_model.predict(X_test_scaled))
+    else:
+        best_model.fit(X_train, y_train)
+        best_accuracy = accuracy_score(y_test, best_model.predict(X_test))
     
-    print(f"\nBest model: {best_model_name} with accuracy: {best_accuracy:.4f}")
+    print(f"\nBest model: {best_model_name} with CV accuracy {leaderboard.loc[0, 'cv_accuracy']:.4f}, "
+          f"test accuracy: {best_accuracy:.4f}")
     
     # Final evaluation with best model
-    if best_model is not None:
-        if best_model_name == 'RandomForest':
-            y_pred_final = best_model.predict(X_test_scaled)
-        else:
-            y_pred_final = best_model.predict(X_test)
-        
-        print("\nFinal Classification Report:")
-        print(classification_report(y_test, y_pred_final))
-    else:
-        print("\nNo model was successfully trained. Please check your data and model configuration.")
+    y_pred_final = best_model.predict(X_test_scaled if best_scaled else X_test)
+    print("\nFinal Classification Report:")
+    print(classification_report(y_test, y_pred_final))
     
     # Feature importance for interpretability
-    if best_model is not None and hasattr(best_model, 'feature_importances_'):
+    if hasattr(best_model, 'feature_importances_'):
         feature_importance = pd.DataFrame({
             'feature': feature_columns,
             'importance': best_model.feature_importances_
@@ -260,13 +504,15 @@ def main():
     # Save the best model and scaler
     model_data = {
         'model': best_model,
-        'scaler': scaler if best_model_name == 'RandomForest' else None,
+        'scaler': scaler if best_scaled else None,
         'feature_columns': feature_columns,
-        'model_type': best_model_name
+        'model_type': best_model_name,
+        # Flat node arrays for the server's NumPy evaluator; saved as memory-mappable .npy files
+        'flat_model': (export_flat_model(best_model, scaler if best_scaled else None)
+                       if isinstance(best_model, (DecisionTreeClassifier, RandomForestClassifier)) else None)
     }
     
-    joblib.dump(model_data, 'enhanced_sorting_hat_model.joblib')
-    print(f"Enhanced model saved as 'enhanced_sorting_hat_model.joblib'")
+    publish_model(model_data, leaderboard)
     
     # Process and save questions
     try:
@@ -283,4 +529,25 @@ def main():
     print("Enhanced training complete!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Train the enhanced Sorting Hat model")
+    parser.add_argument('--chunked', metavar='PATH', help="train incrementally over a CSV or Parquet file read in blocks")
+    parser.add_argument('--generate', type=int, metavar='ROWS', help="with --chunked, first write this many synthetic rows to PATH")
+    parser.add_argument('--learner', choices=['forest', 'sgd'], default='forest', help="incremental learner for --chunked")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="rows per block for --chunked")
+    parser.add_argument('--trees', type=int, default=FOREST_TREES, help="total trees for --chunked --learner forest")
+    parser.add_argument('--convert', metavar='CSV', help="write a columnar copy of a CSV dataset and compare load times")
+    args = parser.parse_args()
+    
+    if args.convert:
+        columnar_path = os.path.splitext(args.convert)[0] + '.columnar'
+        save_columnar(pd.read_csv(args.convert), columnar_path)
+        print(f"Columnar copy saved to '{columnar_path}'")
+        compare_load_speed(args.convert, columnar_path)
+    elif args.chunked:
+        if args.generate:
+            print(f"Writing {args.generate} synthetic rows to '{args.chunked}'...")
+            write_training_data_chunked(args.chunked, args.generate, args.chunk_rows)
+        print(f"Training {args.learner} over '{args.chunked}' in blocks of {args.chunk_rows} rows...")
+        publish_model(train_chunked(args.chunked, args.learner, args.chunk_rows, args.trees))
+    else:
+        main()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
@@ -7,9 +7,24 @@ import logging
 import joblib
 import json
 import numpy as np
+import asyncio
+import glob
+import time
+import random
+import threading
+import sqlite3
+import sys
+from collections import OrderedDict
 from typing import List, Dict, Optional
 from contextlib import asynccontextmanager
 
+# Feature engineering is shared with the trainer in ../Sorting_Hat
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sorting_Hat"))
+from sorting_hat_features import (
+    TRAIT_COLUMNS, BASIC_TRAIT_COLUMNS, FEATURE_COLUMNS, DEFAULT_TRAIT_SCORE,
+    interaction_features, select_features
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -20,28 +35,137 @@ logger = logging.getLogger(__name__)
 # Global variables for Sorting Hat
 sorting_hat_model = None
 sorting_hat_questions = None
+sorting_hat_bank = None
+
+# Model registry configuration
+SORTING_HAT_MODEL_DIR = os.getenv("SORTING_HAT_MODEL_DIR", os.path.join("..", "Sorting_Hat", "models"))
+SORTING_HAT_MODEL_POLL_INTERVAL = float(os.getenv("SORTING_HAT_MODEL_POLL_INTERVAL", 30))  # Seconds between directory scans
+
+def load_flat_model(path: str) -> dict:
+    """Memory-map a flat model directory; every worker shares its pages, with one mapping per array"""
+    return {os.path.splitext(name)[0]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith('.npy')}
+
+def sorting_hat_estimator(model_data):
+    """The sklearn estimator of a model, loading it on first use when it is kept beside a flat export"""
+    if model_data.get('model') is None and model_data.get('estimator_path'):
+        # Two requests racing here both load it; the second assignment just replaces the first
+        model_data['model'] = joblib.load(model_data['estimator_path'])
+    return model_data['model']
+
+class ModelRegistry:
+    """Versioned Sorting Hat models from a watched directory, swapped in atomically with the previous one kept warm"""
+    
+    def __init__(self, directory: str, poll_interval: float):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.active = None  # {'version', 'path', 'loaded_at', 'model'}
+        self.previous = None
+        self.seen = {}  # path -> mtime of every artifact already considered
+    
+    def newest_artifact(self) -> Optional[str]:
+        """Newest .joblib file in the directory that has not been considered yet"""
+        candidates = []
+        for path in glob.glob(os.path.join(self.directory, "*.joblib")):
+            try:
+                candidates.append((os.path.getmtime(path), path))
+            except OSError:
+                continue  # Removed between listing and stat
+        if not candidates:
+            return None
+        mtime, path = max(candidates)
+        return None if self.seen.get(path) == mtime else path
+    
+    def load_version(self, path: str, version: Optional[str] = None) -> dict:
+        """Load an artifact into a registry entry without activating it"""
+        self.seen[path] = os.path.getmtime(path)
+        start_time = time.time()
+        model_data = joblib.load(path)
+        if not isinstance(model_data, dict) or 'model' not in model_data:
+            model_data = {'model': model_data, 'model_type': 'basic'}  # Bare estimator from the basic trainer
+        
+        # Split versions keep the flat arrays and the sklearn estimator beside the index
+        directory = os.path.dirname(path)
+        if model_data.get('flat_model_dir'):
+            model_data['flat_model'] = load_flat_model(os.path.join(directory, model_data['flat_model_dir']))
+        if model_data.get('estimator_path'):
+            model_data['estimator_path'] = os.path.join(directory, model_data['estimator_path'])
+        logger.info(f"Loaded Sorting Hat model {path} in {(time.time() - start_time) * 1000:.1f}ms")
+        return {
+            'version': version or os.path.splitext(os.path.basename(path))[0],
+            'path': path,
+            'loaded_at': time.time(),
+            'model': model_data
+        }
+    
+    def activate(self, entry: dict):
+        """Make an entry the serving model; requests read the global, so the swap is a single assignment"""
+        global sorting_hat_model
+        self.previous, self.active = self.active, entry
+        sorting_hat_model = entry['model']
+        logger.info(f"🎩 Sorting Hat model version {entry['version']} is now active")
+    
+    def rollback(self) -> bool:
+        """Swap the previous version back in"""
+        if self.previous is None:
+            return False
+        self.activate(self.previous)
+        return True
+    
+    def load_latest(self) -> bool:
+        """Load and activate the newest artifact in the directory, if any"""
+        path = self.newest_artifact()
+        if path is None:
+            return False
+        self.activate(self.load_version(path))
+        return True
+    
+    async def watch(self):
+        """Poll the directory and hot-swap new versions, loading them off the event loop"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            path = self.newest_artifact()
+            if path is None:
+                continue
+            try:
+                entry = await asyncio.to_thread(self.load_version, path)
+            except Exception as e:
+                logger.error(f"Failed to load Sorting Hat model {path}: {e}")
+                continue
+            self.activate(entry)
+    
+    def describe(self) -> dict:
+        entry = self.active or {}
+        return {
+            "version": entry.get('version'),
+            "loaded_at": entry.get('loaded_at'),
+            "previous_version": self.previous['version'] if self.previous else None
+        }
+
+model_registry = ModelRegistry(SORTING_HAT_MODEL_DIR, SORTING_HAT_MODEL_POLL_INTERVAL)
 
 # Load Sorting Hat model and questions on startup
 def load_sorting_hat_resources():
-    global sorting_hat_model, sorting_hat_questions
+    global sorting_hat_questions, sorting_hat_bank
     
     try:
-        # Try to load enhanced model first
-        enhanced_model_path = os.path.join("..", "Sorting_Hat", "enhanced_sorting_hat_model.joblib")
-        if not os.path.exists(enhanced_model_path):
-            enhanced_model_path = os.path.join("enhanced_sorting_hat_model.joblib")
-        
-        if os.path.exists(enhanced_model_path):
-            sorting_hat_model = joblib.load(enhanced_model_path)
-            logger.info("Enhanced Sorting Hat model loaded successfully")
-        else:
+        # Prefer the newest versioned artifact from the registry directory
+        if not model_registry.load_latest():
+            # Try to load enhanced model first
+            enhanced_model_path = os.path.join("..", "Sorting_Hat", "enhanced_sorting_hat_model.joblib")
+            if not os.path.exists(enhanced_model_path):
+                enhanced_model_path = os.path.join("enhanced_sorting_hat_model.joblib")
+            
             # Fallback to basic model
             model_path = os.path.join("..", "Sorting_Hat", "sorting_hat_model.joblib")
             if not os.path.exists(model_path):
                 model_path = os.path.join("sorting_hat_model.joblib")
             
-            if os.path.exists(model_path):
-                sorting_hat_model = {'model': joblib.load(model_path), 'model_type': 'basic'}
+            if os.path.exists(enhanced_model_path):
+                model_registry.activate(model_registry.load_version(enhanced_model_path, "enhanced"))
+                logger.info("Enhanced Sorting Hat model loaded successfully")
+            elif os.path.exists(model_path):
+                model_registry.activate(model_registry.load_version(model_path, "basic"))
                 logger.info("Basic Sorting Hat model loaded successfully")
             else:
                 logger.warning("No Sorting Hat model found")
@@ -54,6 +178,7 @@ def load_sorting_hat_resources():
         if os.path.exists(questions_path):
             with open(questions_path, 'r') as f:
                 sorting_hat_questions = json.load(f)
+            sorting_hat_bank = QuestionBank(sorting_hat_questions)
             logger.info(f"Loaded {len(sorting_hat_questions)} Sorting Hat questions")
         else:
             logger.warning("Sorting Hat questions not found")
@@ -61,76 +186,274 @@ def load_sorting_hat_resources():
     except Exception as e:
         logger.error(f"Failed to load Sorting Hat resources: {e}")
 
-def create_interaction_features_dict(traits):
-    """Create interaction features from basic traits"""
-    # Default values for missing traits (if only basic 4 are provided)
-    full_traits = {
-        'bravery_score': traits.get('bravery_score', 5),
-        'wisdom_score': traits.get('wisdom_score', 5), 
-        'ambition_score': traits.get('ambition_score', 5),
-        'loyalty_score': traits.get('loyalty_score', 5),
-        'leadership': traits.get('leadership', 5),
-        'impulsiveness': traits.get('impulsiveness', 5),
-        'justice_oriented': traits.get('justice_oriented', 5),
-        'risk_taking': traits.get('risk_taking', 5)
-    }
+def is_enhanced_model(model_data):
+    """Check whether a loaded model expects the interaction feature columns"""
+    # Every enhanced trainer artifact lists its feature columns, whichever estimator won the search
+    return isinstance(model_data, dict) and 'model' in model_data and 'feature_columns' in model_data
+
+# Requests up to this many rows use the flat-array evaluator; sklearn's compiled traversal wins on larger batches
+SORTING_HAT_FLAT_MAX_ROWS = int(os.getenv("SORTING_HAT_FLAT_MAX_ROWS", 512))
+
+def predict_proba_flat(flat_model, features):
+    """Evaluate a flat-array tree ensemble exported by train_enhanced.export_flat_model"""
+    # Scale like StandardScaler, then compare in float32 like sklearn's tree traversal
+    features = ((np.asarray(features, dtype=np.float64) - flat_model['scaler_mean'])
+                / flat_model['scaler_scale']).astype(np.float32)
+    n_rows, n_features = features.shape
+    n_trees = len(flat_model['roots'])
+    
+    # One cursor per (row, tree) pair, stepped down a level at a time; leaves loop back onto themselves
+    row_offsets = np.repeat(np.arange(n_rows) * n_features, n_trees)
+    nodes = np.tile(flat_model['roots'], n_rows).astype(np.intp)
+    children = flat_model['children'].reshape(-1)  # (left, right) per node
+    for _ in range(int(flat_model['max_depth'])):
+        go_right = features.take(row_offsets + flat_model['feature'].take(nodes)) > flat_model['threshold'].take(nodes)
+        nodes = children.take(nodes * 2 + go_right)
+    
+    return flat_model['value'].take(nodes, axis=0).reshape(n_rows, n_trees, -1).mean(axis=1)
+
+def predict_house_batch(model_data, trait_matrix):
+    """Score an (N, 8) trait matrix in one pass, returning (labels, probabilities, classes)"""
+    if is_enhanced_model(model_data):
+        features = select_features(interaction_features(trait_matrix),
+                                   model_data.get('feature_columns') or FEATURE_COLUMNS)
+        
+        if model_data.get('flat_model') is not None and len(features) <= SORTING_HAT_FLAT_MAX_ROWS:
+            flat_model = model_data['flat_model']
+            probabilities = predict_proba_flat(flat_model, features)
+            return flat_model['classes'][np.argmax(probabilities, axis=1)], probabilities, flat_model['classes']
+        
+        model = sorting_hat_estimator(model_data)
+        if model_data.get('scaler') is not None:
+            features = model_data['scaler'].transform(features)
+    else:
+        # Basic and legacy models only use the four core traits
+        model = model_data['model'] if isinstance(model_data, dict) else model_data
+        features = trait_matrix[:, [TRAIT_COLUMNS.index(col) for col in BASIC_TRAIT_COLUMNS]]
+    
+    # One predict_proba call; labels are its argmax rather than a second predict pass
+    probabilities = model.predict_proba(features)
+    labels = model.classes_[np.argmax(probabilities, axis=1)]
+    return labels, probabilities, model.classes_
+
+# Houses in the column order used by the compiled score tables
+HOUSES = ['Gryffindor', 'Hufflepuff', 'Ravenclaw', 'Slytherin']
+
+# Adaptive questioning - ask the most informative question next and stop once the house is clear
+SORTING_HAT_ADAPTIVE = os.getenv("SORTING_HAT_ADAPTIVE", "true").lower() == "true"
+SORTING_HAT_CONFIDENCE_THRESHOLD = float(os.getenv("SORTING_HAT_CONFIDENCE_THRESHOLD", 0.7))  # On predict_house confidences
+SORTING_HAT_MIN_QUESTIONS = int(os.getenv("SORTING_HAT_MIN_QUESTIONS", 5))
+SORTING_HAT_LIKELIHOOD_SMOOTHING = float(os.getenv("SORTING_HAT_LIKELIHOOD_SMOOTHING", 0.5))
+# The hatstall tie-breaker is kept out of adaptive selection and only asked last, when the
+# top two house confidences are within SORTING_HAT_TIE_MARGIN of each other
+SORTING_HAT_TIE_BREAKER = 'Q15'
+SORTING_HAT_TIE_MARGIN = float(os.getenv("SORTING_HAT_TIE_MARGIN", 0.02))
+
+# Question weights - some questions are more decisive
+QUESTION_WEIGHTS = {
+    'Q01': 3.0,  # "What would you hate to be called?" - Core personality
+    'Q04': 2.8,  # "How would you like to be known?" - Core values
+    'Q07': 2.5,  # "Bridge with troll" - Action under pressure
+    'Q13': 2.5,  # "Which quote resonates?" - Philosophy
+    'Q12': 2.2,  # "Dangerous plant cure" - Moral choices
+    'Q03': 2.0,  # "Troll in headmaster's study" - Priorities
+    'Q15': 3.0,  # "Hatstall tie-breaker" - Direct house preference
+    'Q09': 2.0,  # "Potion guarantee" - Desires (increased for Slytherin)
+    'Q14': 2.2,  # "What power?" - Ambition type (increased for Slytherin)
+    'Q11': 1.8,  # "Locked chest key" - Approach to mystery (increased for cunning)
+    'Q02': 1.5,  # "Enchanted garden" - Curiosity type
+    'Q08': 1.3,  # "Which path tempts?" - Risk preference
+    'Q10': 1.7,  # "After death legacy" - Values
+    'Q05': 1.2,  # "Dawn or Dusk" - General preference
+    'Q06': 1.2,  # "Forest or River" - General preference
+}
+
+# Answer pattern rules - (question_id, answer_index) -> house indicator points.
+# Compiled into per-house bonus vectors by QuestionBank, so scoring is one lookup per answer
+PATTERN_RULES = {
+    ('Q01', 0): {'Slytherin': 2},                     # Ordinary - Slytherins hate being ordinary
+    ('Q01', 1): {'Ravenclaw': 2},                     # Ignorant
+    ('Q01', 2): {'Gryffindor': 2},                    # Cowardly
+    ('Q01', 3): {'Hufflepuff': 1},                    # Selfish
+    ('Q02', 0): {'Gryffindor': 1},                    # Silver-leafed tree
+    ('Q02', 2): {'Slytherin': 1},                     # Bubbling pool - mysterious, potentially powerful
+    ('Q02', 3): {'Ravenclaw': 1},                     # Statue with a twinkling eye
+    ('Q03', 2): {'Ravenclaw': 1, 'Slytherin': 1},     # Runes first - priority for knowledge/power
+    ('Q04', 0): {'Ravenclaw': 2},                     # The Wise
+    ('Q04', 1): {'Hufflepuff': 2},                    # The Good
+    ('Q04', 2): {'Slytherin': 2},                     # The Great - ambition for greatness
+    ('Q04', 3): {'Gryffindor': 2},                    # The Bold
+    ('Q05', 0): {'Gryffindor': 1, 'Hufflepuff': 1},   # Dawn
+    ('Q05', 1): {'Ravenclaw': 1, 'Slytherin': 1},     # Dusk - mystery, night
+    ('Q06', 0): {'Hufflepuff': 1},                    # Forest
+    ('Q06', 1): {'Slytherin': 1},                     # River - water is Slytherin element
+    ('Q07', 0): {'Gryffindor': 2},                    # Volunteer to fight
+    ('Q07', 1): {'Hufflepuff': 1},                    # Drawing lots
+    ('Q07', 2): {'Ravenclaw': 1, 'Slytherin': 1},     # Confuse the troll - cunning approach
+    ('Q07', 3): {'Slytherin': 2},                     # Fight together - strategic group approach
+    ('Q08', 0): {'Gryffindor': 1, 'Hufflepuff': 1},   # Wide, sunny, grassy lane
+    ('Q08', 1): {'Ravenclaw': 1, 'Slytherin': 2},     # Narrow, dark, lantern-lit alley
+    ('Q08', 2): {'Ravenclaw': 1},                     # Twisting, leaf-strewn path
+    ('Q08', 3): {'Slytherin': 1},                     # Cobbled street - history and tradition
+    ('Q09', 0): {'Hufflepuff': 2},                    # Love
+    ('Q09', 1): {'Gryffindor': 1, 'Slytherin': 1},    # Glory - also appeals to Slytherin ambition
+    ('Q09', 2): {'Ravenclaw': 2},                     # Wisdom
+    ('Q09', 3): {'Slytherin': 3},                     # Power - core Slytherin desire
+    ('Q10', 0): {'Hufflepuff': 2},                    # Miss you, but smile
+    ('Q10', 1): {'Gryffindor': 2},                    # Ask for more stories
+    ('Q10', 2): {'Ravenclaw': 1, 'Slytherin': 2},     # Admiration of your achievements
+    ('Q10', 3): {'Ravenclaw': 1, 'Slytherin': 1},     # Don't care what people think
+    ('Q11', 0): {'Hufflepuff': 1},                    # Simple, tarnished key
+    ('Q11', 1): {'Slytherin': 2},                     # Golden, ornate key - wealth/status
+    ('Q11', 2): {'Ravenclaw': 1, 'Slytherin': 1},     # Silver, intricate key - secrets
+    ('Q11', 3): {'Gryffindor': 1},                    # Heavy iron key - a challenge
+    ('Q12', 0): {'Gryffindor': 2},                    # Go into the forest yourself
+    ('Q12', 1): {'Gryffindor': 1, 'Hufflepuff': 2},   # Organize a group
+    ('Q12', 2): {'Ravenclaw': 2},                     # Research the plant
+    ('Q12', 3): {'Slytherin': 2},                     # Clever means - cunning and resourceful
+    ('Q13', 0): {'Gryffindor': 1, 'Slytherin': 1},    # Fortune favors the bold
+    ('Q13', 1): {'Slytherin': 3},                     # The ends justify the means
+    ('Q13', 2): {'Gryffindor': 2, 'Hufflepuff': 1},   # Do what is right
+    ('Q13', 3): {'Hufflepuff': 2},                    # A little kindness
+    ('Q14', 0): {'Ravenclaw': 1, 'Slytherin': 2},     # Read minds - knowledge is power
+    ('Q14', 1): {'Gryffindor': 1, 'Slytherin': 1},    # Invisibility
+    ('Q14', 2): {'Slytherin': 2},                     # Change the past - ultimate control
+    ('Q14', 3): {'Hufflepuff': 2},                    # Speak to animals
+    ('Q15', 0): {'Gryffindor': 3},                    # Hatstall tie-breaker - direct preference
+    ('Q15', 1): {'Hufflepuff': 3},
+    ('Q15', 2): {'Ravenclaw': 3},
+    ('Q15', 3): {'Slytherin': 3},
+}
+
+# Patterns that also feed the final house-score boosts in predict_house
+HOUSE_BOOST_RULES = {('Q01', 0), ('Q01', 2), ('Q09', 3), ('Q13', 1)}
+
+class QuestionBank:
+    """Question bank compiled once at load into an id index and dense score/weight arrays"""
     
-    # Create interaction features
-    result = full_traits.copy()
+    def __init__(self, questions):
+        self.questions = questions
+        self.index = {q['id']: i for i, q in enumerate(questions)}
+        self.option_counts = np.array([len(q['options']) for q in questions], dtype=np.int64)
+        
+        # scores[question, option] is the per-house score vector of that answer
+        max_options = int(self.option_counts.max()) if len(questions) else 0
+        self.scores = np.zeros((len(questions), max_options, len(HOUSES)))
+        for i, question in enumerate(questions):
+            for j, option in enumerate(question['options']):
+                self.scores[i, j] = [option['scores'].get(house, 0) for house in HOUSES]
+        
+        self.weights = np.array([QUESTION_WEIGHTS.get(q['id'], 1.0) for q in questions])
+        
+        # pattern_bonuses[question, option] is the per-house indicator vector of that answer
+        self.pattern_bonuses = np.zeros_like(self.scores)
+        for (question_id, answer_index), indicators in PATTERN_RULES.items():
+            question_index = self.index.get(question_id)
+            if question_index is None or answer_index >= self.option_counts[question_index]:
+                logger.warning(f"Pattern rule {question_id}/{answer_index} does not match the question bank")
+                continue
+            self.pattern_bonuses[question_index, answer_index] = [indicators.get(house, 0) for house in HOUSES]
+        
+        self.boost_bonuses = np.zeros_like(self.scores)
+        for question_id, answer_index in HOUSE_BOOST_RULES:
+            question_index = self.index.get(question_id)
+            if question_index is not None and answer_index < self.option_counts[question_index]:
+                self.boost_bonuses[question_index, answer_index] = self.pattern_bonuses[question_index, answer_index]
     
-    result['bravery_loyalty_ratio'] = full_traits['bravery_score'] / (full_traits['loyalty_score'] + 0.1)
-    result['wisdom_ambition_ratio'] = full_traits['wisdom_score'] / (full_traits['ambition_score'] + 0.1)
-    result['leadership_potential'] = (full_traits['leadership'] + full_traits['bravery_score'] + full_traits['ambition_score']) / 3
-    result['moral_flexibility'] = 10 - full_traits['justice_oriented']
-    result['calculated_thinking'] = (full_traits['wisdom_score'] + (10 - full_traits['impulsiveness'])) / 2
-    result['courage_type'] = full_traits['bravery_score'] * full_traits['risk_taking'] / 10
+        # likelihoods[question, option, house] is the chance a member of that house picks the
+        # option, read off the option scores with additive smoothing; padded options stay at zero
+        valid = (np.arange(max_options)[None, :] < self.option_counts[:, None])[:, :, None]
+        smoothed = np.where(valid, self.scores + SORTING_HAT_LIKELIHOOD_SMOOTHING, 0.0)
+        self.likelihoods = smoothed / np.maximum(smoothed.sum(axis=1, keepdims=True), 1e-12)
+        self.log_likelihoods = np.log(np.where(valid, self.likelihoods, 1.0))
     
-    # House-specific composites
-    result['gryffindor_composite'] = (full_traits['bravery_score'] * 0.3 + full_traits['justice_oriented'] * 0.25 + 
-                                     full_traits['loyalty_score'] * 0.25 + full_traits['risk_taking'] * 0.2)
-    result['hufflepuff_composite'] = (full_traits['loyalty_score'] * 0.4 + full_traits['justice_oriented'] * 0.25 + 
-                                     (10 - full_traits['ambition_score']) * 0.2 + (10 - full_traits['impulsiveness']) * 0.15)
-    result['ravenclaw_composite'] = (full_traits['wisdom_score'] * 0.35 + result['calculated_thinking'] * 0.25 + 
-                                    full_traits['ambition_score'] * 0.2 + full_traits['leadership'] * 0.2)
-    result['slytherin_composite'] = (full_traits['ambition_score'] * 0.35 + full_traits['leadership'] * 0.25 + 
-                                    full_traits['wisdom_score'] * 0.2 + result['moral_flexibility'] * 0.2)
+    def expected_entropies(self, posterior):
+        """Expected house-probability entropy after asking each question, given the current posterior"""
+        joint = self.likelihoods * posterior  # (Q, options, houses)
+        option_probs = joint.sum(axis=2)
+        updated = joint / np.where(option_probs > 0, option_probs, 1.0)[:, :, None]
+        entropies = -(updated * np.log(np.where(updated > 0, updated, 1.0))).sum(axis=2)
+        return (option_probs * entropies).sum(axis=1)
     
-    return result
+    def __len__(self):
+        return len(self.questions)
 
 # Sorting Hat Akinator class
 class SortingHatAkinator:
-    def __init__(self, questions, model):
+    def __init__(self, questions, model, bank=None):
         self.questions = questions
         self.model = model
-        self.user_scores = {'Gryffindor': 0, 'Hufflepuff': 0, 'Ravenclaw': 0, 'Slytherin': 0}
-        self.asked_questions = []
-        self.answer_history = {}  # Track which answers were selected for each question
+        self.bank = bank if bank is not None else QuestionBank(questions)
+        self.reset()
         
     def reset(self):
         """Reset the game state"""
         self.user_scores = {'Gryffindor': 0, 'Hufflepuff': 0, 'Ravenclaw': 0, 'Slytherin': 0}
         self.asked_questions = []
-        self.answer_history = {}
+        self.answer_history = {}  # Track which answers were selected for each question
+        self.asked_mask = 0  # Bitset of asked question indices
+        self.asked_indices = []  # Question index of every answer, in order
+        self.answer_log = []  # Option index of every answer, in order
+        self.answer_indices = np.full(len(self.bank), -1, dtype=np.int64)
+        self.completed = False  # Set once the finished session has been counted in sorting_hat_stats
+
+        # Running scoring state, updated once per answer so predictions never rescan the history
+        self.weighted_totals = np.zeros(len(HOUSES))
+        self.max_weighted_score = 0
+        self.pattern_totals = np.zeros(len(HOUSES))
+        self.boost_totals = np.zeros(len(HOUSES))
+        self.log_posterior = np.zeros(len(HOUSES))  # Uniform prior over houses
+
+    def dump_answers(self) -> bytes:
+        """Encode the answer sequence as (question index, option index) byte pairs"""
+        return np.array([self.asked_indices, self.answer_log], dtype=np.uint8).T.tobytes()
+
+    @classmethod
+    def from_answers(cls, questions, model, bank, data: bytes):
+        """Rebuild a session by replaying an answer sequence from dump_answers"""
+        akinator = cls(questions, model, bank)
+        for question_index, answer_index in np.frombuffer(data, dtype=np.uint8).reshape(-1, 2):
+            akinator.answer_question(questions[question_index]['id'], int(answer_index))
+        return akinator
+
+    def house_posterior(self):
+        """House probabilities implied by the answers so far under the option likelihood model"""
+        posterior = np.exp(self.log_posterior - self.log_posterior.max())
+        return posterior / posterior.sum()
     
-    def get_next_question(self):
+    def get_next_question(self, confidences=None):
         """Get the next best question to ask based on current scores"""
-        if len(self.asked_questions) >= len(self.questions):
-            return None
+        if SORTING_HAT_ADAPTIVE:
+            unasked = self.answer_indices < 0
+            tie_breaker = self.bank.index.get(SORTING_HAT_TIE_BREAKER)
+            candidates = unasked.copy()
+            if tie_breaker is not None:
+                candidates[tie_breaker] = False
+            
+            if candidates.any():
+                # Ask whichever unasked question is expected to leave the least house uncertainty
+                entropies = self.bank.expected_entropies(self.house_posterior())
+                return self.questions[int(np.argmin(np.where(candidates, entropies, np.inf)))]
             
-        available_questions = [q for q in self.questions if q['id'] not in self.asked_questions]
+            # Everything else is answered - break a tie if there is one
+            if tie_breaker is not None and unasked[tie_breaker] and self.is_tied(confidences):
+                return self.questions[tie_breaker]
+            return None
         
-        if not available_questions:
+        # Lowest unset bit of the asked bitset is the first unasked question
+        next_index = (~self.asked_mask & (self.asked_mask + 1)).bit_length() - 1
+        if next_index >= len(self.bank):
             return None
             
-        return available_questions[0]
+        return self.questions[next_index]
     
     def answer_question(self, question_id, answer_index):
         """Process an answer and update scores"""
-        question = next((q for q in self.questions if q['id'] == question_id), None)
-        if not question or answer_index >= len(question['options']):
+        question_index = self.bank.index.get(question_id)
+        if question_index is None or not 0 <= answer_index < self.bank.option_counts[question_index]:
             return False
             
-        answer = question['options'][answer_index]
+        answer = self.questions[question_index]['options'][answer_index]
         
         # Update scores
         for house, score in answer['scores'].items():
@@ -142,8 +465,30 @@ class SortingHatAkinator:
             'answer_text': answer['text'],
             'scores': answer['scores']
         }
-            
+        
+        previous_index = self.answer_indices[question_index]
+        if previous_index >= 0:
+            self.pattern_totals -= self.bank.pattern_bonuses[question_index, previous_index]
+            self.boost_totals -= self.bank.boost_bonuses[question_index, previous_index]
+            self.log_posterior -= self.bank.log_likelihoods[question_index, previous_index]
+        self.pattern_totals += self.bank.pattern_bonuses[question_index, answer_index]
+        self.boost_totals += self.bank.boost_bonuses[question_index, answer_index]
+        self.log_posterior += self.bank.log_likelihoods[question_index, answer_index]
+
+        weight = self.bank.weights[question_index]
+        self.max_weighted_score += weight * 2
+
+        self.asked_mask |= 1 << question_index
+        self.asked_indices.append(question_index)
+        self.answer_log.append(answer_index)
+        self.answer_indices[question_index] = answer_index
         self.asked_questions.append(question_id)
+
+        if previous_index >= 0:
+            # A changed answer is re-counted for every earlier occurrence too, so rebuild
+            self.weighted_totals = self.compute_weighted_totals()
+        else:
+            self.weighted_totals = self.weighted_totals + self.bank.scores[question_index, answer_index] * weight
         return True
     
     def calculate_trait_scores(self):
@@ -158,8 +503,8 @@ class SortingHatAkinator:
         weighted_scores = self.apply_question_weights()
         
         # Calculate normalized scores (0-10 scale)
-        max_weighted_score = sum(self.get_question_weight(q_id) * 2 for q_id in self.asked_questions)
-        
+        max_weighted_score = self.max_weighted_score
+
         if max_weighted_score == 0:
             max_weighted_score = 1  # Prevent division by zero
         
@@ -200,232 +545,50 @@ class SortingHatAkinator:
     
     def get_question_weight(self, question_id):
         """Get the importance weight for a specific question"""
-        # Define question weights - some questions are more decisive
-        question_weights = {
-            'Q01': 3.0,  # "What would you hate to be called?" - Core personality
-            'Q04': 2.8,  # "How would you like to be known?" - Core values
-            'Q07': 2.5,  # "Bridge with troll" - Action under pressure
-            'Q13': 2.5,  # "Which quote resonates?" - Philosophy
-            'Q12': 2.2,  # "Dangerous plant cure" - Moral choices
-            'Q03': 2.0,  # "Troll in headmaster's study" - Priorities
-            'Q15': 3.0,  # "Hatstall tie-breaker" - Direct house preference
-            'Q09': 2.0,  # "Potion guarantee" - Desires (increased for Slytherin)
-            'Q14': 2.2,  # "What power?" - Ambition type (increased for Slytherin)
-            'Q11': 1.8,  # "Locked chest key" - Approach to mystery (increased for cunning)
-            'Q02': 1.5,  # "Enchanted garden" - Curiosity type
-            'Q08': 1.3,  # "Which path tempts?" - Risk preference
-            'Q10': 1.7,  # "After death legacy" - Values
-            'Q05': 1.2,  # "Dawn or Dusk" - General preference
-            'Q06': 1.2,  # "Forest or River" - General preference
-        }
-        return question_weights.get(question_id, 1.0)
+        return QUESTION_WEIGHTS.get(question_id, 1.0)
     
     def apply_question_weights(self):
         """Apply weights to house scores based on question importance"""
-        weighted_scores = {'Gryffindor': 0, 'Hufflepuff': 0, 'Ravenclaw': 0, 'Slytherin': 0}
-        
-        for question_id in self.asked_questions:
-            if question_id in self.answer_history:
-                answer_data = self.answer_history[question_id]
-                weight = self.get_question_weight(question_id)
-                
-                for house, score in answer_data['scores'].items():
-                    weighted_scores[house] += score * weight
-        
-        return weighted_scores
+        if not self.asked_indices:
+            return {house: 0 for house in HOUSES}
+
+        return {house: float(score) for house, score in zip(HOUSES, self.weighted_totals)}
+
+    def compute_weighted_totals(self):
+        """Recompute the weighted house totals from the full answer history"""
+        if not self.asked_indices:
+            return np.zeros(len(HOUSES))
+
+        # Weight the chosen answers' score vectors in one pass; cumsum keeps the
+        # sequential summation order so scores near rounding edges don't drift
+        asked = np.array(self.asked_indices)
+        chosen_scores = self.bank.scores[asked, self.answer_indices[asked]]
+        return np.cumsum(chosen_scores * self.bank.weights[asked, None], axis=0)[-1]
+
+    def get_pattern_indicators(self, bonus_table=None):
+        """Sum the house indicator points of every answered question from a compiled rule table"""
+        if bonus_table is None or bonus_table is self.bank.pattern_bonuses:
+            totals = self.pattern_totals
+        elif bonus_table is self.bank.boost_bonuses:
+            totals = self.boost_totals
+        else:
+            totals = self.sum_indicators(bonus_table)
+        return {house: int(points) for house, points in zip(HOUSES, totals)}
+
+    def sum_indicators(self, bonus_table):
+        """Sum an indicator table over the current answers from scratch"""
+        answered = np.flatnonzero(self.answer_indices >= 0)
+        return bonus_table[answered, self.answer_indices[answered]].sum(axis=0)
     
     def apply_pattern_bonuses(self, trait_scores):
         """Apply bonuses based on answer patterns that strongly indicate specific houses"""
         
         # Analyze answer patterns for house indicators
-        gryffindor_indicators = 0
-        hufflepuff_indicators = 0
-        ravenclaw_indicators = 0
-        slytherin_indicators = 0
-        
-        # Check for specific Gryffindor patterns
-        if 'Q01' in self.answer_history:
-            # "What would you hate to be called?"
-            answer_text = self.answer_history['Q01']['answer_text']
-            if 'Cowardly' in answer_text:
-                gryffindor_indicators += 2  # Strong Gryffindor indicator
-            elif 'Ignorant' in answer_text:
-                ravenclaw_indicators += 2  # Strong Ravenclaw indicator
-            elif 'Selfish' in answer_text:
-                hufflepuff_indicators += 1
-            elif 'Ordinary' in answer_text:
-                slytherin_indicators += 2  # Slytherins hate being ordinary
-                
-        if 'Q02' in self.answer_history:
-            # "Enchanted garden - what interests you?"
-            answer_text = self.answer_history['Q02']['answer_text']
-            if 'bubbling pool' in answer_text and 'luminous' in answer_text:
-                slytherin_indicators += 1  # Mysterious, potentially powerful
-            elif 'silver-leafed tree' in answer_text:
-                gryffindor_indicators += 1
-            elif 'talking toadstools' in answer_text:
-                hufflepuff_indicators += 1
-            elif 'statue' in answer_text and 'twinkling eye' in answer_text:
-                ravenclaw_indicators += 1
-                
-        if 'Q03' in self.answer_history:
-            # "Troll in headmaster's study - rescue order"
-            answer_text = self.answer_history['Q03']['answer_text']
-            if 'book of strange runes' in answer_text:
-                # If runes come first, shows priority for knowledge/power
-                if answer_text.startswith('The book of strange runes'):
-                    slytherin_indicators += 1
-                    ravenclaw_indicators += 1
-                
-        if 'Q04' in self.answer_history:
-            # "How would you like to be known to history?"
-            answer_text = self.answer_history['Q04']['answer_text']
-            if 'Bold' in answer_text:
-                gryffindor_indicators += 2
-            elif 'Great' in answer_text:
-                slytherin_indicators += 2  # Ambition for greatness
-            elif 'Wise' in answer_text:
-                ravenclaw_indicators += 2
-            elif 'Good' in answer_text:
-                hufflepuff_indicators += 2
-                
-        if 'Q05' in self.answer_history:
-            # "Dawn or Dusk?"
-            answer_text = self.answer_history['Q05']['answer_text']
-            if 'Dusk' in answer_text:
-                slytherin_indicators += 1  # Associated with mystery, night
-                ravenclaw_indicators += 1
-            elif 'Dawn' in answer_text:
-                gryffindor_indicators += 1
-                hufflepuff_indicators += 1
-                
-        if 'Q06' in self.answer_history:
-            # "Forest or River?"
-            answer_text = self.answer_history['Q06']['answer_text']
-            if 'River' in answer_text:
-                slytherin_indicators += 1  # Water is Slytherin element
-            elif 'Forest' in answer_text:
-                hufflepuff_indicators += 1
-                
-        if 'Q07' in self.answer_history:
-            # "Bridge with troll - what do you do?"
-            answer_text = self.answer_history['Q07']['answer_text']
-            if 'Volunteer to fight' in answer_text:
-                gryffindor_indicators += 2
-            elif 'drawing lots' in answer_text:
-                hufflepuff_indicators += 1
-            elif 'confuse the troll' in answer_text:
-                ravenclaw_indicators += 1
-                slytherin_indicators += 1  # Cunning approach
-            elif 'fight together' in answer_text:
-                slytherin_indicators += 2  # Strategic group approach
-                
-        if 'Q08' in self.answer_history:
-            # "Which path tempts you most?"
-            answer_text = self.answer_history['Q08']['answer_text']
-            if 'narrow, dark, lantern-lit alley' in answer_text:
-                slytherin_indicators += 2  # Dark, mysterious path
-                ravenclaw_indicators += 1
-            elif 'wide, sunny, grassy lane' in answer_text:
-                hufflepuff_indicators += 1
-                gryffindor_indicators += 1
-            elif 'twisting, leaf-strewn path' in answer_text:
-                ravenclaw_indicators += 1
-            elif 'cobbled street' in answer_text and 'ancient buildings' in answer_text:
-                slytherin_indicators += 1  # History and tradition
-                
-        if 'Q09' in self.answer_history:
-            # "Potion guarantee - what would you choose?"
-            answer_text = self.answer_history['Q09']['answer_text']
-            if 'Power' in answer_text:
-                slytherin_indicators += 3  # Core Slytherin desire
-            elif 'Glory' in answer_text:
-                gryffindor_indicators += 1
-                slytherin_indicators += 1  # Also appeals to Slytherin ambition
-            elif 'Wisdom' in answer_text:
-                ravenclaw_indicators += 2
-            elif 'Love' in answer_text:
-                hufflepuff_indicators += 2
-                
-        if 'Q10' in self.answer_history:
-            # "After death, what would you like people to do?"
-            answer_text = self.answer_history['Q10']['answer_text']
-            if 'Think with admiration of your achievements' in answer_text:
-                slytherin_indicators += 2  # Achievement-focused legacy
-                ravenclaw_indicators += 1
-            elif "don't care what people think" in answer_text:
-                slytherin_indicators += 1  # Self-focused approach
-                ravenclaw_indicators += 1
-            elif 'Miss you, but smile' in answer_text:
-                hufflepuff_indicators += 2
-            elif 'Ask for more stories' in answer_text:
-                gryffindor_indicators += 2
-                
-        if 'Q11' in self.answer_history:
-            # "Locked chest - which key?"
-            answer_text = self.answer_history['Q11']['answer_text']
-            if 'golden, ornate key' in answer_text and 'riches' in answer_text:
-                slytherin_indicators += 2  # Attracted to wealth/status
-            elif 'silver, intricate key' in answer_text and 'secret' in answer_text:
-                slytherin_indicators += 1  # Secrets and mystery
-                ravenclaw_indicators += 1
-            elif 'simple, tarnished key' in answer_text:
-                hufflepuff_indicators += 1
-            elif 'heavy iron key' in answer_text and 'challenge' in answer_text:
-                gryffindor_indicators += 1
-                
-        if 'Q12' in self.answer_history:
-            # "Classmate with magical illness - dangerous plant cure"
-            answer_text = self.answer_history['Q12']['answer_text']
-            if 'Go into the forest yourself' in answer_text:
-                gryffindor_indicators += 2
-            elif 'Organize a group' in answer_text:
-                hufflepuff_indicators += 2
-                gryffindor_indicators += 1
-            elif 'Research the plant' in answer_text:
-                ravenclaw_indicators += 2
-            elif 'clever means' in answer_text or 'trading' in answer_text or 'distraction' in answer_text:
-                slytherin_indicators += 2  # Cunning and resourceful approach
-                
-        if 'Q13' in self.answer_history:
-            # "Which quote resonates most?"
-            answer_text = self.answer_history['Q13']['answer_text']
-            if 'Fortune favors the bold' in answer_text:
-                gryffindor_indicators += 1
-                slytherin_indicators += 1  # Both houses can be bold
-            elif 'ends justify the means' in answer_text:
-                slytherin_indicators += 3  # Classic Slytherin philosophy
-            elif 'Do what is right' in answer_text:
-                gryffindor_indicators += 2
-                hufflepuff_indicators += 1
-            elif 'kindness goes a long way' in answer_text:
-                hufflepuff_indicators += 2
-                
-        if 'Q14' in self.answer_history:
-            # "What kind of power would you rather have?"
-            answer_text = self.answer_history['Q14']['answer_text']
-            if 'read minds' in answer_text:
-                slytherin_indicators += 2  # Knowledge is power
-                ravenclaw_indicators += 1
-            elif 'invisibility' in answer_text:
-                slytherin_indicators += 1  # Stealth and cunning
-                gryffindor_indicators += 1
-            elif 'change the past' in answer_text:
-                slytherin_indicators += 2  # Ultimate power/control
-            elif 'speak to animals' in answer_text:
-                hufflepuff_indicators += 2
-                
-        if 'Q15' in self.answer_history:
-            # "Hatstall tie-breaker - which house?"
-            answer_text = self.answer_history['Q15']['answer_text']
-            if 'Gryffindor' in answer_text:
-                gryffindor_indicators += 3  # Direct preference
-            elif 'Hufflepuff' in answer_text:
-                hufflepuff_indicators += 3
-            elif 'Ravenclaw' in answer_text:
-                ravenclaw_indicators += 3
-            elif 'Slytherin' in answer_text:
-                slytherin_indicators += 3
+        indicators = self.get_pattern_indicators()
+        gryffindor_indicators = indicators['Gryffindor']
+        hufflepuff_indicators = indicators['Hufflepuff']
+        ravenclaw_indicators = indicators['Ravenclaw']
+        slytherin_indicators = indicators['Slytherin']
         
         # Apply significant bonuses for strong patterns
         if gryffindor_indicators >= 3:
@@ -467,44 +630,19 @@ class SortingHatAkinator:
             
         return trait_scores
     
-    def predict_house(self):
+    def predict_house(self, trait_scores=None):
         """Predict the house based on current answers"""
-        trait_scores = self.calculate_trait_scores()
+        if trait_scores is None:
+            trait_scores = self.calculate_trait_scores()
         if not trait_scores:
             return None, None
         
-        # Debug logging to see scoring breakdown
-        logger.info(f"=== SORTING HAT DEBUG ===")
-        logger.info(f"Questions answered: {len(self.asked_questions)}")
-        logger.info(f"Raw house scores: {self.user_scores}")
-        logger.info(f"Final trait scores: {trait_scores}")
-        
-        # Log house indicators from pattern analysis
         weighted_scores = self.apply_question_weights()
-        logger.info(f"Weighted scores: {weighted_scores}")
-        
-        # Log recent answers for debugging
-        for q_id, answer_data in list(self.answer_history.items())[-5:]:
-            logger.info(f"Q{q_id}: '{answer_data['answer_text'][:60]}...' -> {answer_data['scores']}")
-        
-        logger.info(f"=== PATTERN ANALYSIS ===")
-        # Re-run pattern analysis for logging
-        gryffindor_count = hufflepuff_count = ravenclaw_count = slytherin_count = 0
-        
-        # Quick pattern count for logging
-        for q_id, answer_data in self.answer_history.items():
-            answer_text = answer_data['answer_text']
-            if q_id == 'Q01' and 'Cowardly' in answer_text:
-                gryffindor_count += 2
-            elif q_id == 'Q01' and 'Ordinary' in answer_text:
-                slytherin_count += 2
-            elif q_id == 'Q09' and 'Power' in answer_text:
-                slytherin_count += 3
-            elif q_id == 'Q13' and 'ends justify the means' in answer_text:
-                slytherin_count += 3
-                
-        logger.info(f"Pattern indicators - Gryffindor: {gryffindor_count}, Hufflepuff: {hufflepuff_count}, Ravenclaw: {ravenclaw_count}, Slytherin: {slytherin_count}")
-        logger.info(f"========================")
+        
+        # Pattern indicators that drive the house-score boosts
+        indicators = self.get_pattern_indicators(self.bank.boost_bonuses)
+        gryffindor_count = indicators['Gryffindor']
+        slytherin_count = indicators['Slytherin']
         
         # COMPETITIVE HOUSE SCORING - Direct competition between trait scores
         # Convert trait scores to house probabilities with strong differentiation
@@ -520,19 +658,18 @@ class SortingHatAkinator:
             house_scores[house] = house_scores[house] ** 2  # Square to amplify differences
         
         # Add weighted question bonuses directly to house scores
-        weighted_house_scores = self.apply_question_weights()
         for house in house_scores:
-            house_scores[house] += weighted_house_scores[house] * 0.5  # Additional weight bonus
+            house_scores[house] += weighted_scores[house] * 0.5  # Additional weight bonus
         
         # Ensure Slytherin gets proper recognition with pattern boost
         if slytherin_count >= 3:
             house_scores['Slytherin'] *= 1.8  # Strong boost for Slytherin patterns
-            logger.info(f"Applied Slytherin pattern boost - indicators: {slytherin_count}")
+            logger.debug(f"Applied Slytherin pattern boost - indicators: {slytherin_count}")
         
         # Apply Gryffindor pattern boost
         if gryffindor_count >= 3:
             house_scores['Gryffindor'] *= 1.6
-            logger.info(f"Applied Gryffindor pattern boost - indicators: {gryffindor_count}")
+            logger.debug(f"Applied Gryffindor pattern boost - indicators: {gryffindor_count}")
         
         # Calculate probabilities from enhanced house scores
         total_score = sum(house_scores.values())
@@ -542,51 +679,54 @@ class SortingHatAkinator:
         house_confidences = {house: score/total_score for house, score in house_scores.items()}
         prediction = max(house_confidences, key=house_confidences.get)
         
-        logger.info(f"Enhanced house scores: {house_scores}")
-        logger.info(f"Final confidences: {house_confidences}")
-        logger.info(f"Final prediction: {prediction}")
-        
-        # Fall back to ML model if needed (for comparison)
-        if isinstance(sorting_hat_model, dict) and 'model' in sorting_hat_model:
-            model = sorting_hat_model['model']
-            model_type = sorting_hat_model.get('model_type', 'basic')
-            
-            if model_type == 'Enhanced_RandomForest' or 'enhanced' in str(type(model)).lower():
-                # Enhanced model with interaction features
-                full_features = create_interaction_features_dict(trait_scores)
-                feature_columns = sorting_hat_model.get('feature_columns', list(full_features.keys()))
-                features = np.array([[full_features[col] for col in feature_columns]])
-                
-                # Use scaler if available
-                if 'scaler' in sorting_hat_model and sorting_hat_model['scaler'] is not None:
-                    features = sorting_hat_model['scaler'].transform(features)
-                
-                ml_prediction = model.predict(features)[0]
-                ml_probabilities = model.predict_proba(features)[0]
-                ml_house_confidences = dict(zip(model.classes_, ml_probabilities))
-                logger.info(f"ML model would predict: {ml_prediction} with confidences: {ml_house_confidences}")
-        
         # Use our enhanced scoring system instead of ML model
         # This gives us direct control over Slytherin recognition
-        
-        logger.info(f"Model prediction: {prediction} with confidences: {house_confidences}")
-        logger.info(f"========================")
+        # (the ML model is only compared against it by the shadow evaluator)
+        logger.debug(f"Sorting Hat prediction: {prediction} with confidences: {house_confidences}")
         
         return prediction, house_confidences
+
+    def snapshot(self):
+        """Return (prediction, confidences, trait_scores) computed once from the running state"""
+        trait_scores = self.calculate_trait_scores()
+        prediction, confidences = self.predict_house(trait_scores)
+        return prediction, confidences, trait_scores
     
-    def should_continue_asking(self):
-        """Determine if we should continue asking questions - use all 15 questions for maximum accuracy"""
-        # Continue until all questions are asked for the most accurate sorting
+    def is_tied(self, confidences=None):
+        """Whether the top two houses are too close to call"""
+        if confidences is None:
+            _, confidences = self.predict_house()
+        if not confidences:
+            return False
+        top, runner_up = sorted(confidences.values(), reverse=True)[:2]
+        return top - runner_up <= SORTING_HAT_TIE_MARGIN
+    
+    def should_continue_asking(self, confidences=None):
+        """Determine if we should continue asking questions - stop early once the house is clear"""
+        if SORTING_HAT_ADAPTIVE and len(self.asked_questions) >= SORTING_HAT_MIN_QUESTIONS:
+            # Gate on the same confidences the reported prediction comes from
+            if confidences is None:
+                _, confidences = self.predict_house()
+            if confidences and max(confidences.values()) >= SORTING_HAT_CONFIDENCE_THRESHOLD:
+                return False
+        # Otherwise continue until all questions are asked
         return len(self.asked_questions) < len(self.questions)
+    
+    def round_trips_saved(self):
+        """Questions left unasked when the session finished"""
+        return int((self.answer_indices < 0).sum())
 
 # Load Sorting Hat resources on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     load_sorting_hat_resources()
+    model_watcher = asyncio.create_task(model_registry.watch())
+    session_purger = asyncio.create_task(purge_sessions())
     yield
     # Shutdown
-    pass
+    model_watcher.cancel()
+    session_purger.cancel()
 
 app = FastAPI(
     title="Wiz-Scholar AI API",
@@ -642,6 +782,8 @@ class SortingHatGameState(BaseModel):
     should_continue: bool
     questions_asked: int
     game_complete: bool
+    round_trips_saved: int = 0
+    average_round_trips_saved: Optional[float] = None
 
 class TraitScoresRequest(BaseModel):
     bravery_score: int
@@ -649,8 +791,194 @@ class TraitScoresRequest(BaseModel):
     ambition_score: int
     loyalty_score: int
 
-# Global game sessions (in production, use Redis or database)
-game_sessions: Dict[str, SortingHatAkinator] = {}
+class TraitScoresBatchRequest(BaseModel):
+    students: List[TraitScoresRequest]
+
+# Largest cohort accepted by the batch prediction endpoint
+SORTING_HAT_MAX_BATCH = int(os.getenv("SORTING_HAT_MAX_BATCH", 10000))
+
+def build_trait_matrix(students):
+    """Stack trait score requests into an (N, 8) matrix in TRAIT_COLUMNS order"""
+    # Traits the request does not carry take the shared default
+    trait_matrix = np.full((len(students), len(TRAIT_COLUMNS)), DEFAULT_TRAIT_SCORE, dtype=np.int64)
+    trait_matrix[:, :len(BASIC_TRAIT_COLUMNS)] = [
+        [scores.bravery_score, scores.wisdom_score, scores.ambition_score, scores.loyalty_score]
+        for scores in students
+    ]
+    return trait_matrix
+
+# Session store configuration
+SESSION_TTL = int(os.getenv("SESSION_TTL", 3600))  # Idle sessions expire after an hour
+SESSION_MAX = int(os.getenv("SESSION_MAX", 10000))  # Least recently used sessions are evicted beyond this
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH")  # SQLite file shared by workers; sessions live in memory unless set
+SESSION_PURGE_INTERVAL = float(os.getenv("SESSION_PURGE_INTERVAL", 60))  # Seconds between sweeps for expired sessions
+
+class InMemorySessionStore:
+    """Live sessions held in this process with LRU and idle-TTL eviction"""
+    
+    def __init__(self, max_sessions: int, ttl: int):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.lock = threading.Lock()  # Handlers call the store from worker threads
+        self.sessions = OrderedDict()  # session_id -> (akinator, last_used)
+    
+    def get(self, session_id: str) -> Optional[SortingHatAkinator]:
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl:
+                del self.sessions[session_id]
+                return None
+            self.sessions.move_to_end(session_id)
+            return entry[0]
+    
+    def save(self, session_id: str, akinator: SortingHatAkinator):
+        with self.lock:
+            self.sessions[session_id] = (akinator, time.time())
+            self.sessions.move_to_end(session_id)
+            # Evicting from the LRU end is cheap, and keeps the store within max_sessions
+            self._evict()
+    
+    def delete(self, session_id: str) -> bool:
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+    
+    def purge(self):
+        with self.lock:
+            self._evict()
+    
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        while self.sessions:
+            session_id, (_, last_used) = next(iter(self.sessions.items()))
+            if len(self.sessions) <= self.max_sessions and last_used >= cutoff:
+                break
+            del self.sessions[session_id]
+
+class SQLiteSessionStore:
+    """Sessions stored as compact answer sequences in a SQLite file, so any worker can resume them"""
+    
+    def __init__(self, path: str, ttl: int):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, answers BLOB, completed INTEGER DEFAULT 0, updated_at REAL)"
+        )
+        # Files created before the completed flag existed get the column added in place
+        if 'completed' not in {row[1] for row in self.db.execute("PRAGMA table_info(sessions)")}:
+            self.db.execute("ALTER TABLE sessions ADD COLUMN completed INTEGER DEFAULT 0")
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self.db.commit()
+    
+    def get(self, session_id: str) -> Optional[SortingHatAkinator]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT answers, completed FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        akinator = SortingHatAkinator.from_answers(sorting_hat_questions, sorting_hat_model, sorting_hat_bank, row[0])
+        akinator.completed = bool(row[1])
+        return akinator
+    
+    def save(self, session_id: str, akinator: SortingHatAkinator):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sessions (id, answers, completed, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, akinator.dump_answers(), int(akinator.completed), time.time())
+            )
+            self.db.commit()
+    
+    def delete(self, session_id: str) -> bool:
+        with self.lock:
+            deleted = self.db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+            self.db.commit()
+        return deleted > 0
+    
+    def purge(self):
+        with self.lock:
+            self.db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,))
+            self.db.commit()
+
+# Shadow evaluation - compare the rule-based prediction with the ML model off the hot path
+SORTING_HAT_SHADOW_MODE = os.getenv("SORTING_HAT_SHADOW_MODE", "background").lower()  # off | sample | background
+SORTING_HAT_SHADOW_SAMPLE_RATE = float(os.getenv("SORTING_HAT_SHADOW_SAMPLE_RATE", 0.1))  # Fraction of answers compared
+
+class ShadowEvaluator:
+    """Sampled comparison of rule-based and ML predictions, aggregated into agreement counts"""
+    
+    def __init__(self, mode: str, sample_rate: float):
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+        self.evaluated = 0
+        self.agreements = 0
+        self.disagreements = {}  # "rule->ml" -> count
+    
+    def submit(self, background_tasks: BackgroundTasks, rule_prediction, trait_scores):
+        """Schedule a comparison for a sampled share of predictions"""
+        if self.mode == "off" or not trait_scores or random.random() >= self.sample_rate:
+            return
+        if not is_enhanced_model(sorting_hat_model):
+            return
+        if self.mode == "background":
+            # Runs after the response has been sent
+            background_tasks.add_task(self.evaluate, sorting_hat_model, rule_prediction, trait_scores)
+        else:
+            self.evaluate(sorting_hat_model, rule_prediction, trait_scores)
+    
+    def evaluate(self, model_data, rule_prediction, trait_scores):
+        try:
+            trait_row = np.array([[trait_scores.get(col, DEFAULT_TRAIT_SCORE) for col in TRAIT_COLUMNS]])
+            ml_labels, _, _ = predict_house_batch(model_data, trait_row)
+        except Exception as e:
+            logger.warning(f"Shadow evaluation failed: {e}")
+            return
+        ml_prediction = str(ml_labels[0])
+        with self.lock:
+            self.evaluated += 1
+            if ml_prediction == rule_prediction:
+                self.agreements += 1
+            else:
+                pair = f"{rule_prediction}->{ml_prediction}"
+                self.disagreements[pair] = self.disagreements.get(pair, 0) + 1
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "sample_rate": self.sample_rate,
+                "evaluated": self.evaluated,
+                "agreement_rate": self.agreements / self.evaluated if self.evaluated else None,
+                "disagreements": dict(self.disagreements)
+            }
+
+shadow_evaluator = ShadowEvaluator(SORTING_HAT_SHADOW_MODE, SORTING_HAT_SHADOW_SAMPLE_RATE)
+
+# Round trips saved by early stopping, across sessions finished in this process
+sorting_hat_stats = {'sessions_completed': 0, 'round_trips_saved': 0}
+
+def average_round_trips_saved():
+    """Average number of questions skipped per finished session"""
+    if sorting_hat_stats['sessions_completed'] == 0:
+        return None
+    return sorting_hat_stats['round_trips_saved'] / sorting_hat_stats['sessions_completed']
+
+session_store = (SQLiteSessionStore(SESSION_STORE_PATH, SESSION_TTL) if SESSION_STORE_PATH
+                 else InMemorySessionStore(SESSION_MAX, SESSION_TTL))
+
+async def purge_sessions():
+    """Drop expired sessions on a timer, so requests never pay for the sweep"""
+    while True:
+        await asyncio.sleep(SESSION_PURGE_INTERVAL)
+        try:
+            await asyncio.to_thread(session_store.purge)
+        except Exception as e:
+            logger.error(f"Failed to purge Sorting Hat sessions: {e}")
 
 @app.get("/", response_model=dict)
 async def root():
@@ -693,15 +1021,23 @@ async def process_query(request: QueryRequest):
 @app.get("/api/models")
 async def list_models():
     model_status = "available" if sorting_hat_model else "unavailable"
-    model_type = "Enhanced" if isinstance(sorting_hat_model, dict) and sorting_hat_model.get('model_type') == 'Enhanced_RandomForest' else "Basic"
+    model_type = "Enhanced" if is_enhanced_model(sorting_hat_model) else "Basic"
     
     return {
         "models": [
             {"id": "placeholder", "name": "Placeholder Model", "status": "available"},
-            {"id": "sorting-hat", "name": f"{model_type} Sorting Hat ML Model", "status": model_status}
+            {"id": "sorting-hat", "name": f"{model_type} Sorting Hat ML Model", "status": model_status,
+             **model_registry.describe()}
         ]
     }
 
+@app.post("/api/models/sorting-hat/rollback")
+async def rollback_sorting_hat_model():
+    """Reactivate the previously served Sorting Hat model version"""
+    if not model_registry.rollback():
+        raise HTTPException(status_code=409, detail="No previous model version to roll back to")
+    return {"message": "Rolled back Sorting Hat model", **model_registry.describe()}
+
 # Sorting Hat session model
 class SortingHatSessionRequest(BaseModel):
     session_id: str = "default"
@@ -713,8 +1049,8 @@ async def start_sorting_hat_session(request: SortingHatSessionRequest = SortingH
     if not sorting_hat_model or not sorting_hat_questions:
         raise HTTPException(status_code=503, detail="Sorting Hat model not available")
     
-    akinator = SortingHatAkinator(sorting_hat_questions, sorting_hat_model)
-    game_sessions[request.session_id] = akinator
+    akinator = SortingHatAkinator(sorting_hat_questions, sorting_hat_model, sorting_hat_bank)
+    await asyncio.to_thread(session_store.save, request.session_id, akinator)
     
     first_question = akinator.get_next_question()
     
@@ -727,21 +1063,20 @@ async def start_sorting_hat_session(request: SortingHatSessionRequest = SortingH
     )
 
 @app.post("/api/sorting-hat/answer")
-async def answer_sorting_hat_question(answer: SortingHatAnswer):
+async def answer_sorting_hat_question(answer: SortingHatAnswer, background_tasks: BackgroundTasks):
     """Answer a Sorting Hat question"""
-    if answer.session_id not in game_sessions:
+    akinator = await asyncio.to_thread(session_store.get, answer.session_id)
+    if akinator is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    akinator = game_sessions[answer.session_id]
-    
     # Process the answer
     success = akinator.answer_question(answer.question_id, answer.answer_index)
     if not success:
         raise HTTPException(status_code=400, detail="Invalid answer")
     
     # Get prediction
-    predicted_house, confidences = akinator.predict_house()
-    trait_scores = akinator.calculate_trait_scores()
+    predicted_house, confidences, trait_scores = akinator.snapshot()
+    shadow_evaluator.submit(background_tasks, predicted_house, trait_scores)
     
     prediction = None
     if predicted_house and confidences and trait_scores:
@@ -753,20 +1088,32 @@ async def answer_sorting_hat_question(answer: SortingHatAnswer):
         )
     
     # Check if we should continue
-    should_continue = akinator.should_continue_asking()
+    should_continue = akinator.should_continue_asking(confidences)
     next_question = None
     
     if should_continue:
-        next_question = akinator.get_next_question()
+        next_question = akinator.get_next_question(confidences)
     
     game_complete = not should_continue or next_question is None
     
+    round_trips_saved = 0
+    if game_complete:
+        round_trips_saved = akinator.round_trips_saved()
+        # Count each session once, even if the client keeps answering after it finished
+        if not akinator.completed:
+            akinator.completed = True
+            sorting_hat_stats['sessions_completed'] += 1
+            sorting_hat_stats['round_trips_saved'] += round_trips_saved
+    await asyncio.to_thread(session_store.save, answer.session_id, akinator)
+    
     return SortingHatGameState(
         current_question=SortingHatQuestion(**next_question) if next_question else None,
         prediction=prediction,
         should_continue=should_continue and next_question is not None,
         questions_asked=len(akinator.asked_questions),
-        game_complete=game_complete
+        game_complete=game_complete,
+        round_trips_saved=round_trips_saved,
+        average_round_trips_saved=average_round_trips_saved()
     )
 
 @app.post("/api/sorting-hat/predict-direct")
@@ -783,43 +1130,10 @@ async def predict_house_direct(scores: TraitScoresRequest):
             'loyalty_score': scores.loyalty_score
         }
         
-        # Handle enhanced vs basic model
-        if isinstance(sorting_hat_model, dict) and 'model' in sorting_hat_model:
-            model = sorting_hat_model['model']
-            model_type = sorting_hat_model.get('model_type', 'basic')
-            
-            if model_type == 'Enhanced_RandomForest' or 'enhanced' in str(type(model)).lower():
-                # Enhanced model
-                full_features = create_interaction_features_dict(trait_scores)
-                feature_columns = sorting_hat_model.get('feature_columns', list(full_features.keys()))
-                features = np.array([[full_features[col] for col in feature_columns]])
-                
-                if 'scaler' in sorting_hat_model and sorting_hat_model['scaler'] is not None:
-                    features = sorting_hat_model['scaler'].transform(features)
-                
-                prediction = model.predict(features)[0]
-                probabilities = model.predict_proba(features)[0]
-                house_confidences = dict(zip(model.classes_, probabilities))
-            else:
-                # Basic model
-                features = np.array([[trait_scores['bravery_score'], trait_scores['wisdom_score'], 
-                                    trait_scores['ambition_score'], trait_scores['loyalty_score']]])
-                prediction = model.predict(features)[0]
-                probabilities = model.predict_proba(features)[0]
-                house_confidences = dict(zip(model.classes_, probabilities))
-        else:
-            # Legacy model
-            features = np.array([[trait_scores['bravery_score'], trait_scores['wisdom_score'], 
-                                trait_scores['ambition_score'], trait_scores['loyalty_score']]])
-            if isinstance(sorting_hat_model, dict) and 'model' in sorting_hat_model:
-                model = sorting_hat_model['model']
-                prediction = model.predict(features)[0]
-                probabilities = model.predict_proba(features)[0]
-                house_confidences = dict(zip(model.classes_, probabilities))
-            else:
-                prediction = sorting_hat_model.predict(features)[0]
-                probabilities = sorting_hat_model.predict_proba(features)[0]
-                house_confidences = dict(zip(sorting_hat_model.classes_, probabilities))
+        # Single-row batch: same feature pipeline and flat-array fast path as predict-batch
+        labels, probabilities, classes = predict_house_batch(sorting_hat_model, build_trait_matrix([scores]))
+        prediction = str(labels[0])
+        house_confidences = {str(house): float(p) for house, p in zip(classes, probabilities[0])}
         
         return SortingHatPrediction(
             house=prediction,
@@ -831,6 +1145,37 @@ async def predict_house_direct(scores: TraitScoresRequest):
         logger.error(f"Direct prediction failed: {e}")
         raise HTTPException(status_code=500, detail="Prediction failed")
 
+@app.post("/api/sorting-hat/predict-batch")
+async def predict_house_batch_direct(request: TraitScoresBatchRequest):
+    """Predict houses for a whole cohort of trait score vectors in one model pass"""
+    if not sorting_hat_model:
+        raise HTTPException(status_code=503, detail="Sorting Hat model not available")
+    
+    if len(request.students) > SORTING_HAT_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"Batch too large. Max size: {SORTING_HAT_MAX_BATCH}")
+    
+    if not request.students:
+        return {"predictions": [], "count": 0}
+    
+    try:
+        labels, probabilities, classes = predict_house_batch(sorting_hat_model, build_trait_matrix(request.students))
+        
+        classes = [str(house) for house in classes]
+        predictions = [
+            {
+                "house": str(label),
+                "confidence": float(row.max()),
+                "all_confidences": dict(zip(classes, row.tolist())),
+                "trait_scores": scores.dict()
+            }
+            for label, row, scores in zip(labels, probabilities, request.students)
+        ]
+        
+        return {"predictions": predictions, "count": len(predictions)}
+    except Exception as e:
+        logger.error(f"Batch prediction failed: {e}")
+        raise HTTPException(status_code=500, detail="Prediction failed")
+
 @app.get("/api/sorting-hat/questions")
 async def get_all_questions():
     """Get all available Sorting Hat questions"""
@@ -839,11 +1184,22 @@ async def get_all_questions():
     
     return {"questions": sorting_hat_questions}
 
+@app.get("/api/sorting-hat/stats")
+async def get_sorting_hat_stats():
+    """Get early-stopping statistics for finished Sorting Hat sessions"""
+    return {
+        "adaptive": SORTING_HAT_ADAPTIVE,
+        "confidence_threshold": SORTING_HAT_CONFIDENCE_THRESHOLD,
+        "sessions_completed": sorting_hat_stats['sessions_completed'],
+        "average_round_trips_saved": average_round_trips_saved(),
+        "total_questions": len(sorting_hat_questions) if sorting_hat_questions else 0,
+        "shadow_evaluation": shadow_evaluator.stats()
+    }
+
 @app.delete("/api/sorting-hat/session/{session_id}")
 async def end_sorting_hat_session(session_id: str):
     """End a Sorting Hat session"""
-    if session_id in game_sessions:
-        del game_sessions[session_id]
+    if await asyncio.to_thread(session_store.delete, session_id):
         return {"message": "Session ended successfully"}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -103,12 +103,110 @@ def test_prediction():
         print(f"❌ Prediction test failed: {e}")
         return False
 
+def test_flat_model_parity():
+    """Test that the flat-array evaluator matches sklearn's predict_proba"""
+    print("\n=== Testing Flat Model Parity ===")
+    import sys
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.tree import DecisionTreeClassifier
+    
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sorting_Hat"))
+    from train_enhanced import export_flat_model
+    from main import predict_proba_flat
+    
+    rng = np.random.default_rng(0)
+    features = rng.integers(1, 11, size=(600, 18)).astype(np.float64)
+    houses = np.array(['Gryffindor', 'Hufflepuff', 'Ravenclaw', 'Slytherin'])[np.argmax(features[:, :4], axis=1)]
+    scaler = StandardScaler().fit(features)
+    scaled = scaler.transform(features)
+    
+    models = {
+        'RandomForest': (RandomForestClassifier(n_estimators=25, max_depth=8, random_state=42).fit(scaled, houses), scaler, scaled),
+        'DecisionTree': (DecisionTreeClassifier(max_depth=10, random_state=42).fit(features, houses), None, features)
+    }
+    for name, (model, model_scaler, model_inputs) in models.items():
+        flat_model = export_flat_model(model, model_scaler)
+        actual = predict_proba_flat(flat_model, features)
+        
+        assert np.allclose(actual, model.predict_proba(model_inputs), atol=1e-12), f"{name} probabilities differ from sklearn"
+        assert (flat_model['classes'][actual.argmax(axis=1)] == model.predict(model_inputs)).all()
+        print(f"✅ {name} flat evaluator matches sklearn on {len(features)} rows")
+
+def test_split_model_version():
+    """Test that a registry version serves from memory-mapped flat arrays and loads its estimator lazily"""
+    print("\n=== Testing Split Model Version ===")
+    import sys
+    import tempfile
+    from sklearn.ensemble import RandomForestClassifier
+    
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sorting_Hat"))
+    from train_enhanced import export_flat_model, save_model_version
+    from sorting_hat_features import FEATURE_COLUMNS
+    import main
+    
+    rng = np.random.default_rng(0)
+    traits = rng.integers(1, 11, size=(400, 8))
+    features = main.interaction_features(traits)
+    houses = np.array(['Gryffindor', 'Hufflepuff', 'Ravenclaw', 'Slytherin'])[np.argmax(traits[:, :4], axis=1)]
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=42).fit(features, houses)
+    model_data = {'model': model, 'scaler': None, 'feature_columns': FEATURE_COLUMNS,
+                  'model_type': 'RandomForest', 'flat_model': export_flat_model(model)}
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sorting_hat_test.joblib")
+        save_model_version(model_data, path)
+        registry = main.ModelRegistry(directory, 30)
+        served = registry.load_version(path)['model']
+        
+        assert all(isinstance(values, np.memmap) for values in served['flat_model'].values())
+        small, _, _ = main.predict_house_batch(served, traits[:10])
+        assert served['model'] is None, "Small batches should not load the sklearn estimator"
+        
+        large = np.tile(traits, (2, 1))[:main.SORTING_HAT_FLAT_MAX_ROWS + 1]
+        labels, _, _ = main.predict_house_batch(served, large)
+        assert served['model'] is not None
+        assert (labels == model.predict(features[np.arange(len(large)) % len(traits)])).all()
+        assert (small == labels[:10]).all()
+    print("✅ Flat arrays are memory-mapped and the estimator loads only for large batches")
+
+def test_feature_parity():
+    """Test that training and serving compute the same interaction features"""
+    print("\n=== Testing Feature Parity ===")
+    import sys
+    import pandas as pd
+    
+    sorting_hat_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sorting_Hat")
+    sys.path.insert(0, sorting_hat_dir)
+    import train_enhanced
+    import main
+    from sorting_hat_features import FEATURE_COLUMNS, TRAIT_COLUMNS, DERIVED_COLUMNS, create_interaction_features_dict
+    
+    # Trainer's DataFrame path vs the server's matrix kernel on random traits
+    traits = np.random.default_rng(0).integers(1, 11, size=(500, len(TRAIT_COLUMNS)))
+    trained = train_enhanced.create_interaction_features(pd.DataFrame(traits, columns=TRAIT_COLUMNS))
+    served = main.interaction_features(traits)
+    assert np.array_equal(trained[FEATURE_COLUMNS].to_numpy(), served), "Trainer and server features differ"
+    
+    # Single-row dict path matches the batch kernel
+    row = dict(zip(TRAIT_COLUMNS, traits[0].tolist()))
+    assert list(create_interaction_features_dict(row).values()) == served[0].tolist()
+    
+    # The committed training data was built with the same definitions
+    data = pd.read_csv(os.path.join(sorting_hat_dir, "enhanced_sorting_hat_data.csv"))
+    recomputed = main.interaction_features(data[TRAIT_COLUMNS].to_numpy())
+    assert np.allclose(recomputed[:, len(TRAIT_COLUMNS):], data[DERIVED_COLUMNS].to_numpy())
+    print(f"✅ Features match across trainer, server and {len(data)} committed training rows")
+
 def main():
     print("Sorting Hat FastAPI Integration Test")
     print("=" * 50)
     
     test_model_files()
     success = test_prediction()
+    test_flat_model_parity()
+    test_split_model_version()
+    test_feature_parity()
     
     print("\n" + "=" * 50)
     if success:
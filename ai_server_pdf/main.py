@@ -5,10 +5,15 @@ import os
 from dotenv import load_dotenv
 import logging
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
 import PyPDF2
 import io
-import random
-import requests
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+import httpx
 from typing import Optional, List
 
 # Load environment variables
@@ -18,10 +23,20 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    yield
+    # Shutdown - release pooled connections and worker threads
+    await http_client.aclose()
+    llm_executor.shutdown(wait=False)
+    pdf_executor.shutdown(wait=False)
+
 app = FastAPI(
     title="Wiz-Scholar AI API",
     description="AI backend for the Wiz-Scholar application with PDF summarization",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -54,35 +69,211 @@ else:
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10485760))  # 10MB default
 ALLOWED_EXTENSIONS = os.getenv("ALLOWED_EXTENSIONS", "pdf,txt,docx").split(",")
 
-def get_gemini_client():
-    """Get a Gemini client with API key rotation for better rate limit handling"""
-    if not GEMINI_API_KEYS:
-        raise HTTPException(status_code=500, detail="No Gemini API keys configured")
+# LLM execution configuration - Gemini SDK calls block, so they run on a bounded
+# thread pool and each API key gets its own cap on in-flight requests
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", 32))
+LLM_MAX_CONCURRENCY_PER_KEY = int(os.getenv("LLM_MAX_CONCURRENCY_PER_KEY", 8))
+GEMINI_KEY_COOLDOWN = float(os.getenv("GEMINI_KEY_COOLDOWN", 60))  # Seconds a key rests after a 429
+GEMINI_MODEL_NAME = 'models/gemini-2.0-flash-exp'
+
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="gemini")
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether a Gemini error is a 429 / quota exhaustion"""
+    return isinstance(error, google_exceptions.ResourceExhausted) or "429" in str(error)
+
+# GenerativeModel has no public way to take a client, so build_gemini_model binds one
+# through its private _client attribute - only on SDK versions where that is known to work
+GEMINI_SDK_BINDABLE_VERSIONS = ("0.7.", "0.8.")
+
+def build_gemini_model(api_key: str, model_name: str):
+    """Create a GenerativeModel that always calls Gemini with the given API key"""
+    if not genai.__version__.startswith(GEMINI_SDK_BINDABLE_VERSIONS):
+        raise RuntimeError(f"google-generativeai {genai.__version__} is not supported for per-key clients")
     
-    # Rotate through API keys to distribute load
-    api_key = random.choice(GEMINI_API_KEYS)
-    genai.configure(api_key=api_key)
-    # Use the correct Gemini Pro model name with proper prefix
-    return genai.GenerativeModel('models/gemini-2.0-flash-exp')
+    model = genai.GenerativeModel(model_name)
+    if getattr(model, '_client', ...) is not None:
+        raise RuntimeError("google-generativeai no longer exposes GenerativeModel._client")
+    # A dedicated client per key, so requests never depend on the process-global genai.configure()
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return model
 
-def extract_text_from_pdf(pdf_content: bytes) -> str:
-    """Extract text from PDF content"""
+class GeminiKeyPool:
+    """Routes Gemini calls to the least-loaded healthy API key, with one cached model per key"""
+    
+    def __init__(self, api_keys: List[str], model_name: str, max_concurrency_per_key: int, cooldown: float):
+        self.cooldown = cooldown
+        self.keys = []
+        
+        for api_key in api_keys:
+            self.keys.append({
+                'model': build_gemini_model(api_key, model_name),
+                'limit': asyncio.Semaphore(max_concurrency_per_key),
+                'in_flight': 0,
+                'requests': 0,
+                'rate_limited': 0,
+                'cooldown_until': 0.0
+            })
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def pick(self):
+        """Pick the healthy key with the fewest in-flight calls"""
+        if not self.keys:
+            raise HTTPException(status_code=500, detail="No Gemini API keys configured")
+        
+        now = time.monotonic()
+        healthy = [state for state in self.keys if state['cooldown_until'] <= now]
+        if not healthy:
+            # Every key is cooling down - use whichever recovers first
+            return min(self.keys, key=lambda state: state['cooldown_until'])
+        return min(healthy, key=lambda state: state['in_flight'])
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """Reserve a key for one call and yield its model, tracking load and rate limits"""
+        state = self.pick()
+        state['in_flight'] += 1
+        try:
+            async with state['limit']:
+                state['requests'] += 1
+                try:
+                    yield state['model']
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        state['rate_limited'] += 1
+                        state['cooldown_until'] = time.monotonic() + self.cooldown
+                        logger.warning(f"⚠️ Gemini key {self.keys.index(state) + 1} rate limited, cooling down for {self.cooldown:.0f}s")
+                    raise
+        finally:
+            state['in_flight'] -= 1
+    
+    def stats(self) -> List[dict]:
+        """Per-key load and health, without exposing the keys themselves"""
+        now = time.monotonic()
+        return [
+            {
+                "key": f"key_{i + 1}",
+                "healthy": state['cooldown_until'] <= now,
+                "in_flight": state['in_flight'],
+                "requests": state['requests'],
+                "rate_limited": state['rate_limited']
+            }
+            for i, state in enumerate(self.keys)
+        ]
+
+gemini_pool = GeminiKeyPool(GEMINI_API_KEYS, GEMINI_MODEL_NAME, LLM_MAX_CONCURRENCY_PER_KEY, GEMINI_KEY_COOLDOWN)
+
+async def generate_content(prompt: str) -> str:
+    """Run a Gemini generation off the event loop, retrying on another key when rate limited"""
+    loop = asyncio.get_running_loop()
+    
+    for attempt in range(max(1, len(gemini_pool))):
+        try:
+            async with gemini_pool.acquire() as model:
+                response = await loop.run_in_executor(llm_executor, model.generate_content, prompt)
+            return response.text
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == len(gemini_pool) - 1:
+                raise
+
+# PDF download configuration - one pooled client keeps connections to the
+# CDN host alive between requests instead of reconnecting for every file
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", 30))
+PDF_DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("PDF_DOWNLOAD_MAX_CONNECTIONS", 20))
+
+http_client = httpx.AsyncClient(
+    timeout=PDF_DOWNLOAD_TIMEOUT,
+    limits=httpx.Limits(
+        max_connections=PDF_DOWNLOAD_MAX_CONNECTIONS,
+        max_keepalive_connections=PDF_DOWNLOAD_MAX_CONNECTIONS
+    ),
+    follow_redirects=True
+)
+
+async def download_pdf(pdf_url: str) -> bytes:
+    """Stream a PDF from a URL, aborting as soon as it exceeds MAX_FILE_SIZE"""
+    too_large = HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE/1024/1024:.1f}MB")
+    
+    async with http_client.stream("GET", pdf_url) as response:
+        response.raise_for_status()
+        
+        # Validate content type
+        content_type = response.headers.get('content-type', '')
+        if 'pdf' not in content_type.lower() and not pdf_url.lower().endswith('.pdf'):
+            logger.warning(f"Unexpected content type: {content_type}")
+        
+        # Reject up front when the server announces an oversized body
+        content_length = response.headers.get('content-length', '')
+        if content_length.isdigit() and int(content_length) > MAX_FILE_SIZE:
+            raise too_large
+        
+        chunks = []
+        received = 0
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if received > MAX_FILE_SIZE:
+                raise too_large
+            chunks.append(chunk)
+    
+    return b"".join(chunks)
+
+# PDF extraction configuration - page ranges are parsed in parallel worker processes
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 25))
+
+pdf_executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+
+def count_pdf_pages(pdf_content: bytes) -> int:
+    """Count the pages of a PDF without extracting any text - runs inside a worker process"""
+    return len(PyPDF2.PdfReader(io.BytesIO(pdf_content)).pages)
+
+def extract_page_range(pdf_content: bytes, start: int, end: int):
+    """Extract the text of pages [start, end) - runs inside a worker process"""
+    started = time.perf_counter()
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
+    pages = [pdf_reader.pages[i].extract_text() or "" for i in range(start, min(end, len(pdf_reader.pages)))]
+    return pages, time.perf_counter() - started
+
+async def extract_pdf_pages(pdf_content: bytes) -> List[str]:
+    """Extract the text of every page, splitting page ranges across the process pool"""
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        
+        # Count pages in a worker, so the PDF is never parsed on the event loop, then fan out every range at once
+        page_count = await loop.run_in_executor(pdf_executor, count_pdf_pages, pdf_content)
+        tasks = [
+            loop.run_in_executor(pdf_executor, extract_page_range, pdf_content, start, start + PDF_PAGES_PER_TASK)
+            for start in range(0, page_count, PDF_PAGES_PER_TASK)
+        ]
+        results = await asyncio.gather(*tasks)
+        
+        pages = [page for range_pages, _ in results for page in range_pages]
+        worker_seconds = sum(elapsed for _, elapsed in results)
+        elapsed = time.perf_counter() - started
+        
+        if page_count:
+            logger.info(f"Extracted {page_count} pages in {elapsed:.2f}s across {len(results)} task(s) "
+                        f"({worker_seconds / page_count * 1000:.1f} ms/page)")
+        return pages
     except Exception as e:
         logger.error(f"PDF extraction error: {e}")
         raise HTTPException(status_code=400, detail="Failed to extract text from PDF")
 
+async def extract_text_from_pdf(pdf_content: bytes) -> str:
+    """Extract text from PDF content"""
+    pages = await extract_pdf_pages(pdf_content)
+    return "\n".join(pages).strip()
+
 # Data models
 class HealthResponse(BaseModel):
     status: str
     message: str
     ai_status: str
     gemini_keys: int
+    gemini_key_pool: List[dict] = []
 
 class SummaryRequest(BaseModel):
     text: str
@@ -118,7 +309,8 @@ async def health_check():
             status="healthy",
             message="AI server is running with PDF summarization capabilities",
             ai_status=ai_status,
-            gemini_keys=gemini_keys_count
+            gemini_keys=gemini_keys_count,
+            gemini_key_pool=gemini_pool.stats()
         )
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -131,9 +323,6 @@ async def summarize_text(request: SummaryRequest):
         if not request.text.strip():
             raise HTTPException(status_code=400, detail="Text content is required")
         
-        # Get Gemini client
-        model = get_gemini_client()
-        
         # Create prompt based on summary type
         prompts = {
             "academic": f"""
@@ -168,8 +357,7 @@ async def summarize_text(request: SummaryRequest):
         prompt = prompts.get(request.summary_type, prompts["academic"])
         
         # Generate summary
-        response = model.generate_content(prompt)
-        summary = response.text
+        summary = await generate_content(prompt)
         
         # Calculate metrics
         original_length = len(request.text.split())
@@ -207,21 +395,10 @@ async def summarize_pdf_from_url(
     try:
         # Download PDF from URL
         logger.info(f"Downloading PDF from URL: {pdf_url}")
-        response = requests.get(pdf_url, timeout=30)
-        response.raise_for_status()
-        
-        # Validate content type
-        content_type = response.headers.get('content-type', '')
-        if 'pdf' not in content_type.lower() and not pdf_url.lower().endswith('.pdf'):
-            logger.warning(f"Unexpected content type: {content_type}")
-        
-        # Check file size
-        pdf_content = response.content
-        if len(pdf_content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE/1024/1024:.1f}MB")
+        pdf_content = await download_pdf(pdf_url)
         
         # Extract text from PDF
-        text_content = extract_text_from_pdf(pdf_content)
+        text_content = await extract_text_from_pdf(pdf_content)
         
         if not text_content.strip():
             raise HTTPException(status_code=400, detail="No readable text found in PDF")
@@ -241,7 +418,7 @@ async def summarize_pdf_from_url(
         logger.info(f"Successfully summarized PDF: {filename}")
         return summary_response
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Failed to download PDF from URL: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to download PDF: {str(e)}")
     except HTTPException:
@@ -1,13 +1,32 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
 import logging
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
 import PyPDF2
 import io
-import random
+import asyncio
+import time
+import hashlib
+import json
+import threading
+import re
+import uuid
+import ipaddress
+import socket
+from urllib.parse import urlsplit
+import sqlite3
+import mmap
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+import httpx
 from typing import Optional, List
 
 # Load environment variables
@@ -17,10 +36,22 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    await job_queue.start()
+    yield
+    # Shutdown - stop job workers, then release pooled connections and worker threads
+    await job_queue.stop()
+    await http_client.aclose()
+    llm_executor.shutdown(wait=False)
+    pdf_executor.shutdown(wait=False)
+
 app = FastAPI(
     title="Wiz-Scholar AI API",
     description="AI backend for the Wiz-Scholar application with PDF summarization",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -53,35 +84,1029 @@ else:
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10485760))  # 10MB default
 ALLOWED_EXTENSIONS = os.getenv("ALLOWED_EXTENSIONS", "pdf,txt,docx").split(",")
 
-def get_gemini_client():
-    """Get a Gemini client with API key rotation for better rate limit handling"""
-    if not GEMINI_API_KEYS:
-        raise HTTPException(status_code=500, detail="No Gemini API keys configured")
+# LLM execution configuration - Gemini SDK calls block, so they run on a bounded
+# thread pool and each API key gets its own cap on in-flight requests
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", 32))
+LLM_MAX_CONCURRENCY_PER_KEY = int(os.getenv("LLM_MAX_CONCURRENCY_PER_KEY", 8))
+GEMINI_KEY_COOLDOWN = float(os.getenv("GEMINI_KEY_COOLDOWN", 60))  # Seconds a key rests after a 429
+GEMINI_MODEL_NAME = 'models/gemini-2.5-pro'
+
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="gemini")
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether a Gemini error is a 429 / quota exhaustion"""
+    return isinstance(error, google_exceptions.ResourceExhausted) or "429" in str(error)
+
+# GenerativeModel has no public way to take a client, so build_gemini_model binds one
+# through its private _client attribute - only on SDK versions where that is known to work
+GEMINI_SDK_BINDABLE_VERSIONS = ("0.7.", "0.8.")
+
+def build_gemini_model(api_key: str, model_name: str):
+    """Create a GenerativeModel that always calls Gemini with the given API key"""
+    if not genai.__version__.startswith(GEMINI_SDK_BINDABLE_VERSIONS):
+        raise RuntimeError(f"google-generativeai {genai.__version__} is not supported for per-key clients")
     
-    # Rotate through API keys to distribute load
-    api_key = random.choice(GEMINI_API_KEYS)
-    genai.configure(api_key=api_key)
-    # Use the correct Gemini Pro model name with proper prefix
-    return genai.GenerativeModel('models/gemini-2.5-pro')
+    model = genai.GenerativeModel(model_name)
+    if getattr(model, '_client', ...) is not None:
+        raise RuntimeError("google-generativeai no longer exposes GenerativeModel._client")
+    # A dedicated client per key, so requests never depend on the process-global genai.configure()
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return model
 
-def extract_text_from_pdf(pdf_content: bytes) -> str:
-    """Extract text from PDF content"""
+class GeminiKeyPool:
+    """Routes Gemini calls to the least-loaded healthy API key, with one cached model per key"""
+    
+    def __init__(self, api_keys: List[str], model_name: str, max_concurrency_per_key: int, cooldown: float):
+        self.cooldown = cooldown
+        self.keys = []
+        
+        for api_key in api_keys:
+            self.keys.append({
+                'model': build_gemini_model(api_key, model_name),
+                'limit': asyncio.Semaphore(max_concurrency_per_key),
+                'in_flight': 0,
+                'requests': 0,
+                'rate_limited': 0,
+                'cooldown_until': 0.0
+            })
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def pick(self):
+        """Pick the healthy key with the fewest in-flight calls"""
+        if not self.keys:
+            raise HTTPException(status_code=500, detail="No Gemini API keys configured")
+        
+        now = time.monotonic()
+        healthy = [state for state in self.keys if state['cooldown_until'] <= now]
+        if not healthy:
+            # Every key is cooling down - use whichever recovers first
+            return min(self.keys, key=lambda state: state['cooldown_until'])
+        return min(healthy, key=lambda state: state['in_flight'])
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """Reserve a key for one call and yield its model, tracking load and rate limits"""
+        state = self.pick()
+        state['in_flight'] += 1
+        try:
+            async with state['limit']:
+                state['requests'] += 1
+                try:
+                    yield state['model']
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        state['rate_limited'] += 1
+                        state['cooldown_until'] = time.monotonic() + self.cooldown
+                        logger.warning(f"⚠️ Gemini key {self.keys.index(state) + 1} rate limited, cooling down for {self.cooldown:.0f}s")
+                    raise
+        finally:
+            state['in_flight'] -= 1
+    
+    def stats(self) -> List[dict]:
+        """Per-key load and health, without exposing the keys themselves"""
+        now = time.monotonic()
+        return [
+            {
+                "key": f"key_{i + 1}",
+                "healthy": state['cooldown_until'] <= now,
+                "in_flight": state['in_flight'],
+                "requests": state['requests'],
+                "rate_limited": state['rate_limited']
+            }
+            for i, state in enumerate(self.keys)
+        ]
+
+gemini_pool = GeminiKeyPool(GEMINI_API_KEYS, GEMINI_MODEL_NAME, LLM_MAX_CONCURRENCY_PER_KEY, GEMINI_KEY_COOLDOWN)
+
+async def generate_content(prompt: str) -> str:
+    """Run a Gemini generation off the event loop, retrying on another key when rate limited"""
+    loop = asyncio.get_running_loop()
+    
+    for attempt in range(max(1, len(gemini_pool))):
+        try:
+            async with gemini_pool.acquire() as model:
+                response = await loop.run_in_executor(llm_executor, model.generate_content, prompt)
+            return response.text
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == len(gemini_pool) - 1:
+                raise
+
+async def stream_content(prompt: str):
+    """Yield Gemini output text as it is generated, bounded per API key like generate_content"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    finished = object()
+    cancelled = threading.Event()
+    
+    async with gemini_pool.acquire() as model:
+        def produce():
+            # Runs in a worker thread, handing each chunk back to the event loop
+            try:
+                for chunk in model.generate_content(prompt, stream=True):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+        
+        producer = loop.run_in_executor(llm_executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Stop the worker early if the client went away mid-stream
+            cancelled.set()
+            await producer
+
+def format_sse(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# PDF download configuration - one pooled client keeps connections to the
+# CDN host alive between requests instead of reconnecting for every file
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", 30))
+PDF_DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("PDF_DOWNLOAD_MAX_CONNECTIONS", 20))
+
+http_client = httpx.AsyncClient(
+    timeout=PDF_DOWNLOAD_TIMEOUT,
+    limits=httpx.Limits(
+        max_connections=PDF_DOWNLOAD_MAX_CONNECTIONS,
+        max_keepalive_connections=PDF_DOWNLOAD_MAX_CONNECTIONS
+    ),
+    follow_redirects=True
+)
+
+async def download_pdf(pdf_url: str) -> bytes:
+    """Stream a PDF from a URL, aborting as soon as it exceeds MAX_FILE_SIZE"""
+    too_large = HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE/1024/1024:.1f}MB")
+    
+    async with http_client.stream("GET", pdf_url) as response:
+        response.raise_for_status()
+        
+        # Validate content type
+        content_type = response.headers.get('content-type', '')
+        if 'pdf' not in content_type.lower() and not pdf_url.lower().endswith('.pdf'):
+            logger.warning(f"Unexpected content type: {content_type}")
+        
+        # Reject up front when the server announces an oversized body
+        content_length = response.headers.get('content-length', '')
+        if content_length.isdigit() and int(content_length) > MAX_FILE_SIZE:
+            raise too_large
+        
+        chunks = []
+        received = 0
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if received > MAX_FILE_SIZE:
+                raise too_large
+            chunks.append(chunk)
+    
+    return b"".join(chunks)
+
+# PDF extraction configuration - page ranges are parsed in parallel worker processes
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 25))
+
+pdf_executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+
+def count_pdf_pages(pdf_content: bytes) -> int:
+    """Count the pages of a PDF without extracting any text - runs inside a worker process"""
+    return len(PyPDF2.PdfReader(io.BytesIO(pdf_content)).pages)
+
+def extract_page_range(pdf_content: bytes, start: int, end: int):
+    """Extract the text of pages [start, end) - runs inside a worker process"""
+    started = time.perf_counter()
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
+    pages = [pdf_reader.pages[i].extract_text() or "" for i in range(start, min(end, len(pdf_reader.pages)))]
+    return pages, time.perf_counter() - started
+
+async def parse_pdf_pages(pdf_content: bytes) -> List[str]:
+    """Parse the text of every page, splitting page ranges across the process pool"""
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        
+        # Count pages in a worker, so the PDF is never parsed on the event loop, then fan out every range at once
+        page_count = await loop.run_in_executor(pdf_executor, count_pdf_pages, pdf_content)
+        tasks = [
+            loop.run_in_executor(pdf_executor, extract_page_range, pdf_content, start, start + PDF_PAGES_PER_TASK)
+            for start in range(0, page_count, PDF_PAGES_PER_TASK)
+        ]
+        results = await asyncio.gather(*tasks)
+        
+        pages = [page for range_pages, _ in results for page in range_pages]
+        worker_seconds = sum(elapsed for _, elapsed in results)
+        elapsed = time.perf_counter() - started
+        
+        if page_count:
+            logger.info(f"Extracted {page_count} pages in {elapsed:.2f}s across {len(results)} task(s) "
+                        f"({worker_seconds / page_count * 1000:.1f} ms/page)")
+        return pages
     except Exception as e:
         logger.error(f"PDF extraction error: {e}")
         raise HTTPException(status_code=400, detail="Failed to extract text from PDF")
 
+# Extracted text store configuration - parsed PDF text is kept on disk by content hash
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR")  # The store is disabled unless set
+TEXT_STORE_MAX_BYTES = int(os.getenv("TEXT_STORE_MAX_BYTES", 1073741824))  # 1GB default
+
+class ExtractedTextStore:
+    """On-disk store of extracted PDF text plus page offsets, memory-mapped on read"""
+    
+    def __init__(self, store_dir: str, max_bytes: int):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        # Least recently used first, so eviction never has to rescan the directory
+        self.entries = OrderedDict()  # digest -> size in bytes
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._scan()
+    
+    def _scan(self):
+        """Index the entries already on disk, oldest read first - runs once at startup"""
+        entries = {}
+        for entry in os.scandir(self.store_dir):
+            digest = entry.name.split('.', 1)[0]
+            stat = entry.stat()
+            last_used, size = entries.get(digest, (0.0, 0))
+            entries[digest] = (max(last_used, stat.st_mtime), size + stat.st_size)
+        for digest, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            self.entries[digest] = size
+            self.total_bytes += size
+        self._evict()
+    
+    def _paths(self, digest: str):
+        base = os.path.join(self.store_dir, digest)
+        return f"{base}.txt", f"{base}.offsets.npy"
+    
+    def get(self, digest: str) -> Optional[List[str]]:
+        """Return the stored pages for a PDF hash, or None if it was never extracted"""
+        text_path, offsets_path = self._paths(digest)
+        try:
+            offsets = np.load(offsets_path, mmap_mode='r')
+            with open(text_path, 'rb') as f:
+                if offsets[-1] == 0:
+                    return [""] * (len(offsets) - 1)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+                    pages = [text[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+            # Refresh the access time, which orders eviction after a restart
+            os.utime(offsets_path)
+            with self.lock:
+                if digest in self.entries:
+                    self.entries.move_to_end(digest)
+            return pages
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, digest: str, pages: List[str]):
+        """Store the pages for a PDF hash; the offsets file is written last and marks the entry complete"""
+        text_path, offsets_path = self._paths(digest)
+        encoded = [page.encode('utf-8', errors='replace') for page in pages]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(page) for page in encoded], out=offsets[1:])
+        
+        try:
+            with open(f"{text_path}.tmp", 'wb') as f:
+                f.write(b"".join(encoded))
+            os.replace(f"{text_path}.tmp", text_path)
+            with open(f"{offsets_path}.tmp", 'wb') as f:
+                np.save(f, offsets)
+            os.replace(f"{offsets_path}.tmp", offsets_path)
+            size = os.path.getsize(text_path) + os.path.getsize(offsets_path)
+            with self.lock:
+                self.total_bytes += size - self.entries.pop(digest, 0)
+                self.entries[digest] = size
+                self._evict()
+        except OSError as e:
+            logger.warning(f"Failed to store extracted text: {e}")
+    
+    def _evict(self):
+        """Remove the least recently read entries until the store fits its byte budget - caller holds the lock"""
+        while self.entries and self.total_bytes > self.max_bytes:
+            digest, size = self.entries.popitem(last=False)
+            for path in self._paths(digest):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.total_bytes -= size
+
+text_store = ExtractedTextStore(TEXT_STORE_DIR, TEXT_STORE_MAX_BYTES) if TEXT_STORE_DIR else None
+
+async def extract_pdf_pages(pdf_content: bytes) -> List[str]:
+    """Extract the text of every page, reusing the stored text when this PDF was parsed before"""
+    if text_store is None:
+        return await parse_pdf_pages(pdf_content)
+    
+    digest = hashlib.sha256(pdf_content).hexdigest()
+    pages = await asyncio.to_thread(text_store.get, digest)
+    if pages is not None:
+        logger.info(f"Loaded {len(pages)} stored pages, skipping PDF parsing")
+        return pages
+    
+    pages = await parse_pdf_pages(pdf_content)
+    await asyncio.to_thread(text_store.put, digest, pages)
+    return pages
+
+async def extract_text_from_pdf(pdf_content: bytes) -> str:
+    """Extract text from PDF content"""
+    pages = await extract_pdf_pages(pdf_content)
+    return "\n".join(pages).strip()
+
+# Summary cache configuration - results are keyed by content hash, summary type and length
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", 256))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600))  # 7 days default
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR")  # On-disk tier is disabled unless set
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", 104857600))  # 100MB default
+
+class SummaryCache:
+    """Content-addressed summary cache with an in-memory LRU tier and an optional on-disk tier"""
+    
+    def __init__(self, max_entries: int, ttl: int, cache_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.hits = 0
+        self.misses = 0
+        # Disk tier bookkeeping, so eviction never has to rescan the directory
+        self.disk_entries = {}  # key -> (stored_at, size)
+        self.disk_bytes = 0
+        self.disk_lock = threading.Lock()
+        
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._scan_disk()
+    
+    @staticmethod
+    def make_key(namespace: str, content: bytes, summary_type: str, max_length: Optional[int]) -> str:
+        """Build a cache key from the SHA-256 of the content plus the summary options"""
+        digest = hashlib.sha256(content).hexdigest()
+        # Hash again so user-supplied options can never leak into on-disk file names
+        return hashlib.sha256(f"{namespace}:{digest}:{summary_type}:{max_length}".encode()).hexdigest()
+    
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    async def get(self, key: str):
+        """Return the cached value for key, or None when missing or expired"""
+        now = time.time()
+        
+        entry = self.entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if now - stored_at <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+        
+        if self.cache_dir and key in self.disk_entries:
+            entry = await asyncio.to_thread(self._read_disk, key, now)
+            if entry is not None:
+                stored_at, value = entry
+                self._remember(key, stored_at, value)
+                self.hits += 1
+                return value
+        
+        self.misses += 1
+        return None
+    
+    async def set(self, key: str, value: dict):
+        """Store a JSON-serializable value in both tiers"""
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+        
+        if self.cache_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, stored_at, value)
+            except OSError as e:
+                logger.warning(f"Failed to write summary cache entry: {e}")
+    
+    def _remember(self, key: str, stored_at: float, value: dict):
+        self.entries[key] = (stored_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def _scan_disk(self):
+        """Index the files already in the cache directory, oldest first - runs once at startup"""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.name[:-len('.json')]))
+        for stored_at, size, key in sorted(files):
+            self.disk_entries[key] = (stored_at, size)
+            self.disk_bytes += size
+        self._evict_disk(time.time())
+    
+    def _read_disk(self, key: str, now: float):
+        """Load one entry from the disk tier, dropping it when expired - runs in a worker thread"""
+        with self.disk_lock:
+            entry = self.disk_entries.get(key)
+            if entry is None:
+                return None
+            stored_at, _ = entry
+            if now - stored_at > self.ttl:
+                self._remove_disk(key)
+                return None
+        try:
+            with open(self._disk_path(key), 'r') as f:
+                return stored_at, json.load(f)
+        except (OSError, ValueError):
+            with self.disk_lock:
+                self._remove_disk(key)
+            return None
+    
+    def _write_disk(self, key: str, stored_at: float, value: dict):
+        """Write one entry to the disk tier and keep it within budget - runs in a worker thread"""
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        
+        with self.disk_lock:
+            previous = self.disk_entries.pop(key, None)
+            if previous is not None:
+                self.disk_bytes -= previous[1]
+            self.disk_entries[key] = (stored_at, size)
+            self.disk_bytes += size
+            self._evict_disk(stored_at)
+    
+    def _remove_disk(self, key: str):
+        """Forget an entry and delete its file - caller holds disk_lock"""
+        entry = self.disk_entries.pop(key, None)
+        if entry is None:
+            return
+        self.disk_bytes -= entry[1]
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+    
+    def _evict_disk(self, now: float):
+        """Drop expired files, then the oldest ones until the tier fits its byte budget - caller holds disk_lock"""
+        # disk_entries is kept in write order, so the oldest entries come first
+        for key, (stored_at, _) in list(self.disk_entries.items()):
+            if self.disk_bytes <= self.max_disk_bytes and now - stored_at <= self.ttl:
+                break
+            self._remove_disk(key)
+
+summary_cache = SummaryCache(SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL, SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES)
+
+# Summary prompt instructions by summary type
+SUMMARY_INSTRUCTIONS = {
+    "academic": """Create an academic summary of the following text. Focus on key concepts, theories, and important findings.
+    Make it suitable for university students. Keep the summary comprehensive but concise.""",
+    "brief": """Create a brief, concise summary of the following text. Highlight only the most important points.""",
+    "detailed": """Create a detailed summary of the following text. Include all major points, examples, and supporting details.
+    Organize the information clearly with proper structure.""",
+    "bullet_points": """Create a bullet-point summary of the following text. List the key points in a clear, organized format.
+    Use bullet points to make it easy to scan and understand."""
+}
+
+# Chunked summarization configuration - texts longer than one chunk are summarized
+# map-reduce style: every chunk concurrently, then a reduce pass over the partials
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", 30000))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", 8))
+SUMMARY_REDUCE_FANOUT = max(2, int(os.getenv("SUMMARY_REDUCE_FANOUT", 8)))
+
+def build_summary_prompt(text: str, summary_type: str) -> str:
+    """Build the final summary prompt for a summary type"""
+    instruction = SUMMARY_INSTRUCTIONS.get(summary_type, SUMMARY_INSTRUCTIONS["academic"])
+    return f"""
+    {instruction}
+    
+    Text to summarize:
+    {text}
+    """
+
+def split_text_into_chunks(text: str, max_chars: int) -> List[str]:
+    """Split text into chunks of at most max_chars, preferring section, page/line and sentence boundaries"""
+    chunks = []
+    remaining = text
+    
+    while len(remaining) > max_chars:
+        window = remaining[:max_chars]
+        cut = max_chars
+        for separator in ("\n\n", "\n", ". ", " "):
+            position = window.rfind(separator)
+            if position > max_chars // 2:
+                cut = position + len(separator)
+                break
+        
+        chunks.append(remaining[:cut].strip())
+        remaining = remaining[cut:]
+    
+    chunks.append(remaining.strip())
+    return [chunk for chunk in chunks if chunk]
+
+async def build_long_text_prompt(text: str, summary_type: str) -> str:
+    """Summarize chunks concurrently and merge them until one final reduce prompt remains"""
+    chunks = split_text_into_chunks(text, SUMMARY_CHUNK_CHARS)
+    fan_out = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+    
+    async def run(prompt: str) -> str:
+        async with fan_out:
+            return await generate_content(prompt)
+    
+    def join_parts(parts: List[str]) -> str:
+        return "\n\n".join(f"Part {i + 1}:\n{part}" for i, part in enumerate(parts))
+    
+    # Map: summarize every chunk on its own
+    logger.info(f"Summarizing {len(text)} characters as {len(chunks)} chunks")
+    partials = await asyncio.gather(*(
+        run(f"""
+        Summarize the following section (part {i + 1} of {len(chunks)}) of a longer document.
+        Keep every key concept, finding, definition and example a final summary may need.
+        
+        Section:
+        {chunk}
+        """)
+        for i, chunk in enumerate(chunks)
+    ))
+    
+    # Merge intermediate levels until one reduce pass can take every partial summary
+    while len(partials) > SUMMARY_REDUCE_FANOUT:
+        groups = [partials[i:i + SUMMARY_REDUCE_FANOUT] for i in range(0, len(partials), SUMMARY_REDUCE_FANOUT)]
+        partials = await asyncio.gather(*(
+            run(f"""
+            The following are summaries of consecutive parts of one document.
+            Combine them into a single summary that keeps every key point, in order.
+            
+            {join_parts(group)}
+            """)
+            for group in groups
+        ))
+    
+    # Reduce: the final prompt asks for the requested summary type over the partial summaries
+    return build_summary_prompt(
+        f"Summaries of consecutive parts of one document:\n\n{join_parts(partials)}",
+        summary_type
+    )
+
+async def build_text_summary_prompt(text: str, summary_type: str) -> str:
+    """Build the prompt for a text, running the chunked map-reduce pipeline for long ones"""
+    if len(text) > SUMMARY_CHUNK_CHARS:
+        return await build_long_text_prompt(text, summary_type)
+    return build_summary_prompt(text, summary_type)
+
+def build_answer_prompt(question: str, context: str, answer_style: str) -> str:
+    """Build the question-answering prompt for an answer style"""
+    style_prompts = {
+        "concise": "Provide a concise, direct answer.",
+        "detailed": "Provide a detailed, comprehensive answer with explanations.",
+        "explanatory": "Provide an explanatory answer that teaches the concept step by step."
+    }
+    
+    style_instruction = style_prompts.get(answer_style, style_prompts["concise"])
+    
+    return f"""
+    Based on the following context, answer the question. {style_instruction}
+    
+    Context:
+    {context}
+    
+    Question: {question}
+    
+    Answer:
+    """
+
+# Question answering retrieval configuration - long contexts are indexed once and
+# only the passages most relevant to each question are sent to the model
+QA_FULL_CONTEXT_CHARS = int(os.getenv("QA_FULL_CONTEXT_CHARS", 8000))
+QA_PASSAGE_CHARS = int(os.getenv("QA_PASSAGE_CHARS", 1500))
+QA_TOP_K = int(os.getenv("QA_TOP_K", 5))
+QA_INDEX_CACHE_SIZE = int(os.getenv("QA_INDEX_CACHE_SIZE", 32))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+class PassageIndex:
+    """BM25 index over the passages of one document, scored with NumPy postings arrays"""
+    
+    def __init__(self, text: str, passage_chars: int, k1: float = 1.5, b: float = 0.75):
+        self.passages = split_text_into_chunks(text, passage_chars)
+        self.vocabulary = {}
+        
+        term_ids, doc_ids, term_freqs = [], [], []
+        doc_lengths = np.zeros(len(self.passages), dtype=np.float64)
+        for doc_id, passage in enumerate(self.passages):
+            tokens = TOKEN_PATTERN.findall(passage.lower())
+            doc_lengths[doc_id] = len(tokens)
+            ids, counts = np.unique(
+                np.fromiter((self.vocabulary.setdefault(t, len(self.vocabulary)) for t in tokens), dtype=np.int64),
+                return_counts=True
+            )
+            term_ids.append(ids)
+            doc_ids.append(np.full(len(ids), doc_id, dtype=np.int64))
+            term_freqs.append(counts)
+        
+        term_ids = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int64)
+        doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int64)
+        term_freqs = np.concatenate(term_freqs).astype(np.float64) if term_freqs else np.zeros(0)
+        
+        # Sort postings by term so each term's postings are one contiguous slice
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, self.doc_ids, term_freqs = term_ids[order], doc_ids[order], term_freqs[order]
+        self.term_offsets = np.searchsorted(term_ids, np.arange(len(self.vocabulary) + 1))
+        
+        # Precompute each posting's BM25 weight so a query is only slice sums
+        doc_freqs = np.diff(self.term_offsets)
+        idf = np.log(1 + (len(self.passages) - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        avg_length = doc_lengths.mean() if len(doc_lengths) else 0.0
+        norm = k1 * (1 - b + b * doc_lengths[self.doc_ids] / (avg_length or 1.0))
+        self.weights = idf[term_ids] * term_freqs * (k1 + 1) / (term_freqs + norm)
+    
+    def search(self, query: str, top_k: int) -> List[str]:
+        """Return the top_k passages for a query, in document order"""
+        scores = np.zeros(len(self.passages))
+        for term in set(TOKEN_PATTERN.findall(query.lower())):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            np.add.at(scores, self.doc_ids[start:end], self.weights[start:end])
+        
+        if top_k < len(scores):
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[scores[best] > 0]
+        if len(best) == 0:
+            # Nothing matched, so fall back to the start of the document
+            best = np.arange(min(top_k, len(self.passages)))
+        
+        return [self.passages[i] for i in np.sort(best)]
+
+passage_indexes = OrderedDict()  # context hash -> PassageIndex
+
+async def select_answer_context(question: str, context: str):
+    """Pick the context to send for a question, returning it with the number of passages used"""
+    if len(context) <= QA_FULL_CONTEXT_CHARS:
+        return context, None
+    
+    index_key = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    index = passage_indexes.get(index_key)
+    if index is None:
+        started = time.perf_counter()
+        index = await asyncio.to_thread(PassageIndex, context, QA_PASSAGE_CHARS)
+        logger.info(f"Built retrieval index over {len(index.passages)} passages in {time.perf_counter() - started:.2f}s")
+        passage_indexes[index_key] = index
+        while len(passage_indexes) > QA_INDEX_CACHE_SIZE:
+            passage_indexes.popitem(last=False)
+    passage_indexes.move_to_end(index_key)
+    
+    passages = index.search(question, QA_TOP_K)
+    return "\n\n...\n\n".join(passages), len(passages)
+
+# Background job configuration - large PDFs are summarized outside the HTTP request
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 100))  # Submissions beyond this are rejected
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 24 * 3600))  # Finished jobs are kept for 24h
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH")  # SQLite file, may be shared by workers; jobs live in memory unless set
+JOB_LEASE = float(os.getenv("JOB_LEASE", 300))  # A running job whose lease lapses this long is taken over by another worker
+# Hosts job callbacks may be sent to; any public host is allowed when unset
+JOB_CALLBACK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+async def check_callback_url(callback_url: str):
+    """Reject callback URLs that could reach internal services - raises ValueError"""
+    parts = urlsplit(callback_url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError("Callback URL must be an absolute http(s) URL")
+    
+    host = parts.hostname.lower()
+    if JOB_CALLBACK_ALLOWED_HOSTS and host not in JOB_CALLBACK_ALLOWED_HOSTS:
+        raise ValueError(f"Callback host {host} is not allowed")
+    
+    # Check every address the host resolves to, not just the literal in the URL
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(host, parts.port or (443 if parts.scheme == 'https' else 80), type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"Callback host {host} could not be resolved")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Callback host {host} resolves to a non-public address")
+
+class InMemoryJobStore:
+    """Job records and payloads held in this process"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()  # The queue calls the store from worker threads
+        self.jobs = {}
+        self.payloads = {}
+    
+    def create(self, job: dict, payload: Optional[bytes]):
+        self.purge()
+        with self.lock:
+            self.jobs[job['id']] = dict(job, owner=None, lease_until=None)
+            self.payloads[job['id']] = payload
+    
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def get_payload(self, job_id: str) -> Optional[bytes]:
+        with self.lock:
+            return self.payloads.get(job_id)
+    
+    def update(self, job_id: str, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields, updated_at=time.time())
+            if fields.get('status') in ('completed', 'failed'):
+                self.payloads.pop(job_id, None)
+    
+    def _claimable(self, job: dict, now: float) -> bool:
+        return job['status'] == 'queued' or (job['status'] == 'running' and (job['lease_until'] or 0) < now)
+    
+    def claim(self, job_id: str, owner: str, lease_until: float) -> bool:
+        """Mark a job running for owner, unless it is finished or another owner's lease is live"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or not self._claimable(job, time.time()):
+                return False
+            job.update(status='running', owner=owner, lease_until=lease_until, updated_at=time.time())
+            return True
+    
+    def renew(self, job_id: str, owner: str, lease_until: float):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job['owner'] == owner and job['status'] == 'running':
+                job['lease_until'] = lease_until
+    
+    def pending(self) -> List[dict]:
+        """Jobs waiting to run, or whose runner stopped renewing its lease"""
+        now = time.time()
+        with self.lock:
+            return [dict(job) for job in self.jobs.values() if self._claimable(job, now)]
+    
+    def purge(self):
+        cutoff = time.time() - JOB_RESULT_TTL
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.jobs.items()
+                           if job['status'] in ('completed', 'failed') and job['updated_at'] < cutoff]:
+                del self.jobs[job_id]
+
+class SQLiteJobStore:
+    """Job records and payloads in a SQLite file, so queued jobs survive a restart and workers can share them"""
+    
+    FIELDS = ('id', 'kind', 'status', 'priority', 'params', 'callback_url', 'result', 'error', 'created_at', 'updated_at')
+    
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT, status TEXT, priority INTEGER, params TEXT,
+                callback_url TEXT, result TEXT, error TEXT, created_at REAL, updated_at REAL, payload BLOB,
+                owner TEXT, lease_until REAL
+            )
+        """)
+        # Files created before jobs were leased get the columns added in place
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self.db.commit()
+    
+    def _to_job(self, row) -> dict:
+        job = dict(zip(self.FIELDS, row))
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+    
+    def create(self, job: dict, payload: Optional[bytes]):
+        self.purge()
+        with self.lock:
+            self.db.execute(
+                f"INSERT INTO jobs ({', '.join(self.FIELDS)}, payload) VALUES ({', '.join('?' * (len(self.FIELDS) + 1))})",
+                [json.dumps(job[f]) if f in ('params', 'result') else job[f] for f in self.FIELDS] + [payload]
+            )
+            self.db.commit()
+    
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            row = self.db.execute(f"SELECT {', '.join(self.FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+    
+    def get_payload(self, job_id: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.db.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+    
+    def update(self, job_id: str, **fields):
+        fields['updated_at'] = time.time()
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        if fields.get('status') in ('completed', 'failed'):
+            fields['payload'] = None
+        with self.lock:
+            self.db.execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                list(fields.values()) + [job_id]
+            )
+            self.db.commit()
+    
+    # Queued, or running under a lease its owner stopped renewing (a crashed worker)
+    CLAIMABLE = "(status = 'queued' OR (status = 'running' AND COALESCE(lease_until, 0) < ?))"
+    
+    def claim(self, job_id: str, owner: str, lease_until: float) -> bool:
+        """Atomically mark a job running for owner, so workers sharing the file never run it twice"""
+        now = time.time()
+        with self.lock:
+            claimed = self.db.execute(
+                f"UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ? WHERE id = ? AND {self.CLAIMABLE}",
+                (owner, lease_until, now, job_id, now)
+            ).rowcount
+            self.db.commit()
+        return claimed == 1
+    
+    def renew(self, job_id: str, owner: str, lease_until: float):
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (lease_until, job_id, owner)
+            )
+            self.db.commit()
+    
+    def pending(self) -> List[dict]:
+        """Jobs waiting to run, or whose runner stopped renewing its lease"""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {', '.join(self.FIELDS)} FROM jobs WHERE {self.CLAIMABLE} ORDER BY created_at",
+                (time.time(),)
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+    
+    def purge(self):
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?",
+                (time.time() - JOB_RESULT_TTL,)
+            )
+            self.db.commit()
+
+class JobQueue:
+    """Bounded priority queue of summarization jobs, drained by a fixed pool of workers"""
+    
+    def __init__(self, store, workers: int, max_size: int):
+        self.store = store
+        self.workers = workers
+        self.queue = asyncio.PriorityQueue(maxsize=max_size)
+        self.tasks = []
+        self.sequence = 0
+        self.owner = uuid.uuid4().hex  # Identifies this process's claims in a shared store
+    
+    async def start(self):
+        # Re-enqueue anything not yet claimed or left behind by a crashed worker; jobs another
+        # live worker holds keep their lease, and claim() stops a job being run twice
+        for job in await asyncio.to_thread(self.store.pending):
+            try:
+                self._enqueue(job)
+            except asyncio.QueueFull:
+                logger.warning("Job queue is full; leaving the remaining pending jobs for another worker or restart")
+                break
+        if self.queue.qsize():
+            logger.info(f"Resumed {self.queue.qsize()} pending summarization job(s)")
+        
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+    
+    def _enqueue(self, job: dict):
+        # Higher priority first, then first come first served
+        self.sequence += 1
+        self.queue.put_nowait((-job['priority'], self.sequence, job['id']))
+    
+    async def submit(self, kind: str, params: dict, payload: Optional[bytes], priority: int, callback_url: Optional[str]) -> dict:
+        """Accept a job, or reject it with 503 when the queue is full"""
+        queue_full = HTTPException(status_code=503, detail="Job queue is full, retry later", headers={"Retry-After": "30"})
+        if self.queue.full():
+            raise queue_full
+        if callback_url:
+            try:
+                await check_callback_url(callback_url)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': 'queued',
+            'priority': priority,
+            'params': params,
+            'callback_url': callback_url,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        await asyncio.to_thread(self.store.create, job, payload)
+        try:
+            self._enqueue(job)
+        except asyncio.QueueFull:
+            # Another submission filled the queue while this one was being stored
+            await asyncio.to_thread(self.store.update, job['id'], status='failed', error="Job queue is full")
+            raise queue_full
+        return job
+    
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                # Keep the worker alive, e.g. when the store itself fails
+                logger.exception(f"Summarization job {job_id} could not be processed")
+            finally:
+                self.queue.task_done()
+    
+    async def _keep_lease(self, job_id: str):
+        """Renew a running job's lease until cancelled, so no other worker takes it over"""
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            await asyncio.to_thread(self.store.renew, job_id, self.owner, time.time() + JOB_LEASE)
+    
+    async def _run(self, job_id: str):
+        if not await asyncio.to_thread(self.store.claim, job_id, self.owner, time.time() + JOB_LEASE):
+            return  # Gone, finished, or being run by another worker sharing the store
+        job = await asyncio.to_thread(self.store.get, job_id)
+        
+        params = job['params']
+        lease = asyncio.create_task(self._keep_lease(job_id))
+        try:
+            if job['kind'] == 'url':
+                pdf_content = await download_pdf(params['pdf_url'])
+            else:
+                pdf_content = await asyncio.to_thread(self.store.get_payload, job_id)
+            
+            result = await summarize_pdf_content(pdf_content, params['summary_type'], params['max_length'])
+            
+            response_dict = dict(result["summary"])
+            response_dict["filename"] = params.get('filename') or "PDF Document"
+            if job['kind'] == 'url':
+                response_dict["source_url"] = params['pdf_url']
+                response_dict["text_length"] = result["text_length"]
+            
+            await asyncio.to_thread(self.store.update, job_id, status='completed', result=response_dict)
+            logger.info(f"Summarization job {job_id} completed")
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            await asyncio.to_thread(self.store.update, job_id, status='failed', error=detail)
+            logger.error(f"Summarization job {job_id} failed: {detail}")
+        finally:
+            lease.cancel()
+        
+        if job['callback_url']:
+            await self._notify(job_id, job['callback_url'])
+    
+    async def _notify(self, job_id: str, callback_url: str):
+        """POST the finished job to its callback URL, best effort"""
+        try:
+            # Checked again here, since DNS may have changed since the job was accepted
+            await check_callback_url(callback_url)
+            job = await asyncio.to_thread(self.store.get, job_id)
+            # No redirects, so an allowed host can't bounce the request somewhere internal
+            response = await http_client.post(callback_url, json=job, follow_redirects=False)
+            response.raise_for_status()
+        except (ValueError, httpx.HTTPError) as e:
+            logger.warning(f"Callback for job {job_id} failed: {e}")
+
+job_queue = JobQueue(
+    SQLiteJobStore(JOB_STORE_PATH) if JOB_STORE_PATH else InMemoryJobStore(),
+    JOB_WORKERS,
+    JOB_QUEUE_SIZE
+)
+
 # Data models
 class HealthResponse(BaseModel):
     status: str
     message: str
     ai_status: str
     gemini_keys: int
+    gemini_key_pool: List[dict] = []
 
 class QueryRequest(BaseModel):
     query: str
@@ -133,7 +1158,8 @@ async def health_check():
             status="healthy",
             message="AI server is running with PDF summarization capabilities",
             ai_status=ai_status,
-            gemini_keys=gemini_keys_count
+            gemini_keys=gemini_keys_count,
+            gemini_key_pool=gemini_pool.stats()
         )
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -153,6 +1179,21 @@ async def process_query(request: QueryRequest):
         logger.error(f"Query processing failed: {e}")
         raise HTTPException(status_code=500, detail="Query processing failed")
 
+def build_summary_response(request: SummaryRequest, summary: str) -> SummaryResponse:
+    """Calculate summary metrics and wrap them in a SummaryResponse"""
+    original_length = len(request.text)
+    summary_length = len(summary)
+    compression_ratio = round((summary_length / original_length) * 100, 2) if original_length > 0 else 0
+    
+    return SummaryResponse(
+        summary=summary,
+        original_length=original_length,
+        summary_length=summary_length,
+        compression_ratio=compression_ratio,
+        summary_type=request.summary_type,
+        model_used="gemini-2.5-pro-latest"
+    )
+
 @app.post("/api/summarize", response_model=SummaryResponse)
 async def summarize_text(request: SummaryRequest):
     """Summarize text using Gemini AI"""
@@ -160,64 +1201,58 @@ async def summarize_text(request: SummaryRequest):
         if not request.text.strip():
             raise HTTPException(status_code=400, detail="Text content is required")
         
-        # Get Gemini client
-        model = get_gemini_client()
-        
-        # Create prompt based on summary type
-        prompts = {
-            "academic": f"""
-            Create an academic summary of the following text. Focus on key concepts, theories, and important findings.
-            Make it suitable for university students. Keep the summary comprehensive but concise.
-            
-            Text to summarize:
-            {request.text}
-            """,
-            "brief": f"""
-            Create a brief, concise summary of the following text. Highlight only the most important points.
-
-            Text to summarize:
-            {request.text}
-            """,
-            "detailed": f"""
-            Create a detailed summary of the following text. Include all major points, examples, and supporting details.
-            Organize the information clearly with proper structure.
-            
-            Text to summarize:
-            {request.text}
-            """,
-            "bullet_points": f"""
-            Create a bullet-point summary of the following text. List the key points in a clear, organized format.
-            Use bullet points to make it easy to scan and understand.
-            
-            Text to summarize:
-            {request.text}
-            """
-        }
+        # Serve repeated texts from the cache without a model call
+        cache_key = SummaryCache.make_key("text", request.text.encode("utf-8"), request.summary_type, request.max_length)
+        cached_summary = await summary_cache.get(cache_key)
+        if cached_summary is not None:
+            logger.info("Summary cache hit for text")
+            return SummaryResponse(**cached_summary)
         
-        prompt = prompts.get(request.summary_type, prompts["academic"])
+        # Long texts go through the chunked map-reduce pipeline
+        prompt = await build_text_summary_prompt(request.text, request.summary_type)
         
         # Generate summary
-        response = model.generate_content(prompt)
-        summary = response.text
-        
-        # Calculate metrics
-        original_length = len(request.text)
-        summary_length = len(summary)
-        compression_ratio = round((summary_length / original_length) * 100, 2) if original_length > 0 else 0
-        
-        return SummaryResponse(
-            summary=summary,
-            original_length=original_length,
-            summary_length=summary_length,
-            compression_ratio=compression_ratio,
-            summary_type=request.summary_type,
-            model_used="gemini-2.5-pro-latest"
-        )
+        summary = await generate_content(prompt)
+        
+        summary_response = build_summary_response(request, summary)
+        await summary_cache.set(cache_key, summary_response.dict())
+        
+        return summary_response
         
     except Exception as e:
         logger.error(f"Text summarization failed: {e}")
         raise HTTPException(status_code=500, detail=f"Summarization failed: {str(e)}")
 
+async def summarize_pdf_content(pdf_content: bytes, summary_type: str, max_length: Optional[int]) -> dict:
+    """Summarize raw PDF bytes, skipping extraction and the model call on a cache hit"""
+    cache_key = SummaryCache.make_key("pdf", pdf_content, summary_type, max_length)
+    cached_result = await summary_cache.get(cache_key)
+    if cached_result is not None:
+        logger.info("Summary cache hit for PDF")
+        return cached_result
+    
+    # Extract text from PDF
+    text_content = await extract_text_from_pdf(pdf_content)
+    
+    if not text_content.strip():
+        raise HTTPException(status_code=400, detail="No readable text found in PDF")
+    
+    logger.info(f"Extracted {len(text_content)} characters from PDF")
+    
+    # Create summary request
+    summary_request = SummaryRequest(
+        text=text_content,
+        summary_type=summary_type,
+        max_length=max_length
+    )
+    
+    # Process summary
+    summary_response = await summarize_text(summary_request)
+    
+    result = {"summary": summary_response.dict(), "text_length": len(text_content)}
+    await summary_cache.set(cache_key, result)
+    return result
+
 @app.post("/api/summarize-pdf")
 async def summarize_pdf(
     file: UploadFile = File(...),
@@ -235,24 +1270,11 @@ async def summarize_pdf(
         if len(content) > MAX_FILE_SIZE:
             raise HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE/1024/1024:.1f}MB")
         
-        # Extract text from PDF
-        text_content = extract_text_from_pdf(content)
-        
-        if not text_content.strip():
-            raise HTTPException(status_code=400, detail="No readable text found in PDF")
-        
-        # Create summary request
-        summary_request = SummaryRequest(
-            text=text_content,
-            summary_type=summary_type,
-            max_length=max_length
-        )
-        
-        # Process summary
-        summary_response = await summarize_text(summary_request)
+        # Summarize, reusing any cached result for the same PDF and options
+        result = await summarize_pdf_content(content, summary_type, max_length)
         
         # Add filename to response
-        response_dict = summary_response.dict()
+        response_dict = dict(result["summary"])
         response_dict["filename"] = file.filename
         
         return response_dict
@@ -273,45 +1295,95 @@ async def answer_question(request: QuestionAnswerRequest):
         if not request.context.strip():
             raise HTTPException(status_code=400, detail="Context is required")
         
-        # Get Gemini client
-        model = get_gemini_client()
+        # Send only the passages relevant to the question for long contexts
+        context, passages_used = await select_answer_context(request.question, request.context)
         
         # Create prompt based on answer style
-        style_prompts = {
-            "concise": "Provide a concise, direct answer.",
-            "detailed": "Provide a detailed, comprehensive answer with explanations.",
-            "explanatory": "Provide an explanatory answer that teaches the concept step by step."
-        }
-        
-        style_instruction = style_prompts.get(request.answer_style, style_prompts["concise"])
-        
-        prompt = f"""
-        Based on the following context, answer the question. {style_instruction}
-        
-        Context:
-        {request.context}
-        
-        Question: {request.question}
-        
-        Answer:
-        """
+        prompt = build_answer_prompt(request.question, context, request.answer_style)
         
         # Generate answer
-        response = model.generate_content(prompt)
-        answer = response.text
+        answer = await generate_content(prompt)
         
         return {
             "question": request.question,
             "answer": answer,
             "answer_style": request.answer_style,
             "model_used": "gemini-2.5-pro-latest",
-            "context_length": len(request.context)
+            "context_length": len(request.context),
+            "passages_used": passages_used
         }
         
     except Exception as e:
         logger.error(f"Question answering failed: {e}")
         raise HTTPException(status_code=500, detail=f"Question answering failed: {str(e)}")
 
+@app.post("/api/summarize/stream")
+async def summarize_text_stream(request: SummaryRequest):
+    """Summarize text using Gemini AI, streaming the summary as server-sent events"""
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text content is required")
+    
+    cache_key = SummaryCache.make_key("text", request.text.encode("utf-8"), request.summary_type, request.max_length)
+    
+    async def events():
+        try:
+            cached_summary = await summary_cache.get(cache_key)
+            if cached_summary is not None:
+                logger.info("Summary cache hit for text")
+                yield format_sse("chunk", {"text": cached_summary["summary"]})
+                yield format_sse("done", cached_summary)
+                return
+            
+            prompt = await build_text_summary_prompt(request.text, request.summary_type)
+            
+            parts = []
+            async for text in stream_content(prompt):
+                parts.append(text)
+                yield format_sse("chunk", {"text": text})
+            
+            summary_response = build_summary_response(request, "".join(parts))
+            await summary_cache.set(cache_key, summary_response.dict())
+            yield format_sse("done", summary_response.dict())
+        except Exception as e:
+            logger.error(f"Streaming summarization failed: {e}")
+            yield format_sse("error", {"detail": f"Summarization failed: {str(e)}"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/api/question-answer/stream")
+async def answer_question_stream(request: QuestionAnswerRequest):
+    """Answer a question using Gemini AI, streaming the answer as server-sent events"""
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question is required")
+    
+    if not request.context.strip():
+        raise HTTPException(status_code=400, detail="Context is required")
+    
+    async def events():
+        try:
+            # Send only the passages relevant to the question for long contexts
+            context, passages_used = await select_answer_context(request.question, request.context)
+            prompt = build_answer_prompt(request.question, context, request.answer_style)
+            
+            parts = []
+            async for text in stream_content(prompt):
+                parts.append(text)
+                yield format_sse("chunk", {"text": text})
+            
+            yield format_sse("done", {
+                "question": request.question,
+                "answer": "".join(parts),
+                "answer_style": request.answer_style,
+                "model_used": "gemini-2.5-pro-latest",
+                "context_length": len(request.context),
+                "passages_used": passages_used
+            })
+        except Exception as e:
+            logger.error(f"Streaming question answering failed: {e}")
+            yield format_sse("error", {"detail": f"Question answering failed: {str(e)}"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post("/api/summarize-pdf-url")
 async def summarize_pdf_from_url(
     pdf_url: str = Form(...),
@@ -321,51 +1393,23 @@ async def summarize_pdf_from_url(
 ):
     """Summarize a PDF from a URL (e.g., Cloudinary URL)"""
     try:
-        import requests
-        
         # Download PDF from URL
         logger.info(f"Downloading PDF from URL: {pdf_url}")
-        response = requests.get(pdf_url, timeout=30)
-        response.raise_for_status()
+        pdf_content = await download_pdf(pdf_url)
         
-        # Validate content type
-        content_type = response.headers.get('content-type', '')
-        if 'pdf' not in content_type.lower() and not pdf_url.lower().endswith('.pdf'):
-            logger.warning(f"Unexpected content type: {content_type}")
-        
-        # Check file size
-        pdf_content = response.content
-        if len(pdf_content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE/1024/1024:.1f}MB")
-        
-        # Extract text from PDF
-        text_content = extract_text_from_pdf(pdf_content)
-        
-        if not text_content.strip():
-            raise HTTPException(status_code=400, detail="No readable text found in PDF")
-        
-        logger.info(f"Extracted {len(text_content)} characters from PDF")
-        
-        # Create summary request
-        summary_request = SummaryRequest(
-            text=text_content,
-            summary_type=summary_type,
-            max_length=max_length
-        )
-        
-        # Process summary
-        summary_response = await summarize_text(summary_request)
+        # Summarize, reusing any cached result for the same PDF and options
+        result = await summarize_pdf_content(pdf_content, summary_type, max_length)
         
         # Add metadata to response
-        response_dict = summary_response.dict()
+        response_dict = dict(result["summary"])
         response_dict["filename"] = filename or "PDF Document"
         response_dict["source_url"] = pdf_url
-        response_dict["text_length"] = len(text_content)
+        response_dict["text_length"] = result["text_length"]
         
         logger.info(f"Successfully summarized PDF: {filename}")
         return response_dict
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Failed to download PDF from URL: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to download PDF: {str(e)}")
     except HTTPException:
@@ -374,6 +1418,59 @@ async def summarize_pdf_from_url(
         logger.error(f"PDF URL summarization failed: {e}")
         raise HTTPException(status_code=500, detail=f"PDF processing failed: {str(e)}")
 
+@app.post("/api/jobs/summarize-pdf", status_code=202)
+async def submit_pdf_summary_job(
+    file: UploadFile = File(...),
+    summary_type: str = Form("academic"),
+    max_length: Optional[int] = Form(None),
+    priority: int = Form(0),
+    callback_url: Optional[str] = Form(None)
+):
+    """Queue an uploaded PDF for summarization and return a job id to poll"""
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    
+    content = await file.read()
+    if len(content) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE/1024/1024:.1f}MB")
+    
+    params = {"summary_type": summary_type, "max_length": max_length, "filename": file.filename}
+    job = await job_queue.submit('pdf', params, content, priority, callback_url)
+    
+    return {"job_id": job['id'], "status": job['status'], "status_url": f"/api/jobs/{job['id']}"}
+
+@app.post("/api/jobs/summarize-pdf-url", status_code=202)
+async def submit_pdf_url_summary_job(
+    pdf_url: str = Form(...),
+    summary_type: str = Form("academic"),
+    max_length: Optional[int] = Form(None),
+    filename: Optional[str] = Form(None),
+    priority: int = Form(0),
+    callback_url: Optional[str] = Form(None)
+):
+    """Queue a PDF URL for summarization and return a job id to poll"""
+    params = {"summary_type": summary_type, "max_length": max_length, "filename": filename, "pdf_url": pdf_url}
+    job = await job_queue.submit('url', params, None, priority, callback_url)
+    
+    return {"job_id": job['id'], "status": job['status'], "status_url": f"/api/jobs/{job['id']}"}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status, and once finished the result or error, of a summarization job"""
+    job = await asyncio.to_thread(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "job_id": job['id'],
+        "status": job['status'],
+        "priority": job['priority'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+        "result": job['result'],
+        "error": job['error']
+    }
+
 @app.get("/api/models")
 async def list_models():
     """List available Gemini models"""
@@ -0,0 +1,78 @@
+"""
+Tests for the per-key Gemini clients behind GeminiKeyPool, in both PDF servers
+"""
+import os
+import re
+import importlib.util
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..")
+
+# Each server keeps its own copy of GeminiKeyPool, so every test runs against both
+SERVERS = {
+    "pdf_summarizer_main": os.path.join(REPO_ROOT, "pdf_summarizer", "ai_server"),
+    "ai_server_pdf_main": os.path.join(REPO_ROOT, "ai_server_pdf")
+}
+
+def load_server(name):
+    """Import a server's main.py under its own name, so it can't clash with other servers' main modules"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SERVERS[name], "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_pinned_sdk_supports_per_key_clients():
+    """Each server's pinned google-generativeai must be one build_gemini_model accepts"""
+    print("=== Testing pinned Gemini SDK versions ===")
+    for name, directory in SERVERS.items():
+        server = load_server(name)
+        with open(os.path.join(directory, "requirements.txt")) as f:
+            pinned = re.search(r"^google-generativeai==(\S+)$", f.read(), re.MULTILINE).group(1)
+        assert pinned.startswith(server.GEMINI_SDK_BINDABLE_VERSIONS), f"{name} pins {pinned}"
+        print(f"✅ {name} pins google-generativeai {pinned}")
+
+def test_build_gemini_model_binds_key():
+    """Every model must carry its own client, authenticated with its own key"""
+    print("=== Testing per-key Gemini clients ===")
+    for name in SERVERS:
+        server = load_server(name)
+
+        first = server.build_gemini_model("test-key-1", server.GEMINI_MODEL_NAME)
+        second = server.build_gemini_model("test-key-2", server.GEMINI_MODEL_NAME)
+
+        assert first._client is not second._client
+        assert first._client._transport._credentials.token == "test-key-1"
+        assert second._client._transport._credentials.token == "test-key-2"
+        print(f"✅ {name}: each model is bound to its own key")
+
+def test_build_gemini_model_rejects_unknown_sdk():
+    """An SDK outside the known versions fails loudly instead of silently sharing one key"""
+    for name in SERVERS:
+        server = load_server(name)
+        installed = server.genai.__version__
+        server.genai.__version__ = "0.3.2"
+        try:
+            server.build_gemini_model("test-key-1", server.GEMINI_MODEL_NAME)
+            assert False, f"{name} accepted an unsupported SDK"
+        except RuntimeError:
+            print(f"✅ {name}: unsupported SDK is rejected")
+        finally:
+            server.genai.__version__ = installed
+
+def test_key_pool_spreads_load():
+    """The pool hands out the least-loaded healthy key"""
+    for name in SERVERS:
+        server = load_server(name)
+        pool = server.GeminiKeyPool(["test-key-1", "test-key-2"], server.GEMINI_MODEL_NAME, 1, 60)
+
+        pool.keys[0]['in_flight'] = 1
+        assert pool.pick() is pool.keys[1]
+
+        pool.keys[1]['cooldown_until'] = float('inf')
+        assert pool.pick() is pool.keys[0]
+        print(f"✅ {name}: pool picks the least-loaded healthy key")
+
+if __name__ == "__main__":
+    test_pinned_sdk_supports_per_key_clients()
+    test_build_gemini_model_binds_key()
+    test_build_gemini_model_rejects_unknown_sdk()
+    test_key_pool_spreads_load()